@@ -1,10 +1,24 @@
 ###########################################
 ########## Package Imports
 ###########################################
-import pandas as pd, numpy as np
-import DatastreamDSWS as DSWS
+import logging, os
+import pandas as pd
 from datetime import datetime as dt
 import streamlit as st
+from ds_fetch import ResultCache, fetch_metrics, fetch_series
+from ds_async import run_fetch
+from ds_replay import connect_source, replay_settings
+from dashboard_data import CORRELATION_WINDOW, backfill_snapshots, build_snapshot, stage
+from fetch_stats import FetchStats
+from profiler import finish_profile, start_profile
+from metrics import REGISTRY, sparkline_metrics
+from dashboard_style import TableCache, pending_table
+from snapshot_store import SnapshotStore
+from history_cube import HistoryCube
+from sparklines import SparklineCache
+from series_store import SeriesStore
+from rolling import RollingCorrelationMatrix, RollingRegressions
+from zscore import ZScoreEngine
 
 
 
@@ -14,1339 +28,317 @@ import streamlit as st
 ######## Initialise Connection
 ##############################################
 
-# Initialise login credentials
-username=st.secrets.credentials.username
-password=st.secrets.credentials.password
+# Data source: 'dsws' (live), 'record' (live, saving every response) or 'replay' (recorded fixtures, no network)
+data_source = os.environ.get('DASHBOARD_DATA_SOURCE', 'dsws')
+fixture_dir = os.environ.get('DASHBOARD_FIXTURE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures'))
 
-# Create connection using the username and password
-ds = DSWS.Datastream(username = username, password = password)
+# Initialise login credentials, not needed to replay fixtures
+if data_source != 'replay':
+    username=st.secrets.credentials.username
+    password=st.secrets.credentials.password
+else:
+    username = password = None
 
+# Fetch with the asyncio DSWS client instead of the synchronous connection on DASHBOARD_FETCH_ASYNC=1 (live source only)
+fetch_async = os.environ.get('DASHBOARD_FETCH_ASYNC', '0') == '1' and data_source == 'dsws'
 
+# Only render snapshots published by refresher.py, never fetch inside the page request
+use_refresher = os.environ.get('DASHBOARD_USE_REFRESHER', '0') == '1'
 
-#####################################################################################
-######################### Initialise Mappings ##############################
-#####################################################################################
+# One connection per process, shared by every session and rerun; it logs in on its first request
+# and reuses the token and HTTP connections until shortly before the token expires
+@st.cache_resource
+def get_datastream():
+    return connect_source(data_source, fixture_dir, username, password, **replay_settings())
 
-# Sector Name to Sector DS code mapping
-dict_sectors = {
-    "Technology": "TECNOWD",
-    "Financials": "FINANWD",
-    "Consumer Discretionary": "CNDISWD",
-    "Industrials": "INDUSWD",
-    "Healthcare": "HLTHCWD",
-    "Consumer Staples": "COSTPWD",
-    "Energy": "ENEGYWD",
-    "Basic Materials": "BMATRWD",
-    "Telecom": "TELCMWD",
-    "Utilities": "UTILSWD",
-    "Real Estate": "RLESTWD"
-}
-
-# Sector Name to IBES Code Mapping
-dict_ibes = {
-    "Technology": "@:AFM1IT",
-    "Financials": "@:AFM1FN",
-    "Consumer Discretionary": "@:AFM1CD",
-    "Industrials": "@:AFM1ID",
-    "Healthcare": "@:AFM1HC",
-    "Consumer Staples": "@:AFM1CS",
-    "Energy": "@:AFM1E1",
-    "Basic Materials": "@:AFM1M1",
-    "Telecom": "@:AFM1T1",
-    "Utilities": "@:AFM1U1",
-    "Real Estate": "@:AFM1RE" #"@:AFM2R2"
-}
-
-
-
-
-
-# Sector Names List
-input_sectors = ['Technology', 'Financials', 'Consumer Discretionary', 'Industrials', 'Healthcare',
-                 'Consumer Staples', 'Energy', 'Basic Materials', 'Telecom', 'Utilities', 'Real Estate']
-
-
-
-# Initialise Parameters
-start = "-0d"
-end = "-0d"
-start_90 = '-90d'
-end_90 = '-90d'
-freq_d = "D"
-freq_m = "M"
-
-
-# Arrow Color code
-UP = '<span style="color:green;">&#x25B2;</span>'
-DOWN = '<span style="color:red;">&#x25BC;</span>'
-
-
-
-# Create empty data frame
-df = pd.DataFrame(input_sectors, columns = ['sector'])
-
-# Create DS Sector Codes column
-df['sector_ticker'] = df['sector'].map(dict_sectors)
-
-# Create G#L modified DS sector codes column
-df['sector_ticker_gl'] = 'G#L' + df['sector_ticker']
-
-# Create IBES ticker codes column
-df['sector_ticker_ibes'] = df['sector'].map(dict_ibes)
-
-# Create Tickers
-tickers = ','.join(df['sector_ticker'])
-tickers_gl = ','.join(df['sector_ticker_gl'].to_list())
-tickers_ibes = ','.join(df['sector_ticker_ibes'].to_list())
-
-
-
-
-
-########################################################################################################
-#################################### PERFORMANCE #######################################################
-########################################################################################################
-
-
-
-
-############################################# MTD (%) Metric ##########################################
-
-# MTD parameters
-fields_mtd = ['PCHV#(X,MTD)']
-
-# Create MTD metric dataframe
-df_mtd = ds.get_data(tickers = tickers, 
-            start = start, 
-            end = end,
-            freq = freq_d,
-            fields=fields_mtd
-           )
-
-# Merge to main dataframe
-df = df.merge(df_mtd[['Instrument', 'Value']], left_on = 'sector_ticker', right_on = 'Instrument', how='left')
-df.rename(columns = {'Value': 'mtd_performance'}, inplace=True)
-df.drop(columns = ['Instrument'], inplace=True)
-
-
-
-
-
-############################################# YTD (%) Metric ##########################################
-
-# MTD parameters
-fields_ytd = ['PCHV#(X,YTD)']
-
-# Create MTD metric dataframe
-df_ytd = ds.get_data(tickers = tickers, 
-            start = start, 
-            end = end,
-            freq = freq_d,
-            fields=fields_ytd
-           )
-
-# Merge to main dataframe
-df = df.merge(df_ytd[['Instrument', 'Value']], left_on = 'sector_ticker', right_on = 'Instrument', how='left')
-df.rename(columns = {'Value': 'ytd_performance'}, inplace=True)
-df.drop(columns = ['Instrument'], inplace=True)
-
-
-
-
-
-############################################# 1Y Performance Metric ##########################################
-
-# MTD parameters
-fields_1y = ['PCH#(X,1Y)']
-
-# Create MTD metric dataframe
-df_1y = ds.get_data(tickers = tickers, 
-            start = start, 
-            end = end,
-            freq = freq_d,
-            fields = fields_1y
-           )
-
-# Merge to main dataframe
-df = df.merge(df_1y[['Instrument', 'Value']], left_on = 'sector_ticker', right_on = 'Instrument', how='left')
-df.rename(columns = {'Value': '1y_performance'}, inplace=True)
-df.drop(columns = ['Instrument'], inplace=True)
-
-
-
-#################################### 3Y Performance ########################################
-
-# MTD parameters
-fields_3y = ['GRFL#(X,3Y)']
-
-  
-## Extract MTD Performance Data
-df_3y = ds.get_data(tickers = tickers, 
-                    start = start, 
-                    end = end,
-                    freq=freq_d,
-                    fields = fields_3y
-                   )
-
-# Merge to main dataframe
-df = df.merge(df_3y[['Instrument', 'Value']], left_on = 'sector_ticker', right_on = 'Instrument', how='left')
-df.rename(columns = {'Value': '3y_cagr'}, inplace=True)
-df.drop(columns = ['Instrument'], inplace=True)
-
-
-
-
-
-
-########################################################################################################
-#################################### TECHNICALS #######################################################
-########################################################################################################
-
-
-
-
-############################################# RSI Metric ##########################################
-
-# RSI parameters
-fields_rsi = ['RSI#(X,14D)']
-
-# Create RSI metric dataframe
-df_rsi = ds.get_data(tickers = tickers, 
-            start = start, 
-            end = end,
-            freq = freq_d,
-            fields=fields_rsi
-           )
-
-# Merge to main dataframe
-df = df.merge(df_rsi[['Instrument', 'Value']], left_on = 'sector_ticker', right_on = 'Instrument', how='left')
-df.rename(columns = {'Value': 'rsi_14'}, inplace=True)
-df.drop(columns = ['Instrument'], inplace=True)
-
-
-
-
-############################################# Breadth Metric ##########################################
-
-# Breadth Parameters
-fields_breadth = ['(LIST#(X,IF#(X-MAV#(X,200D),GT,ZERO),AVG))*100.00']
-
-# Create Breadth metric dataframe
-df_breadth = ds.get_data(tickers = tickers_gl,
-            start = start, 
-            end = end,
-            freq = freq_d,
-            fields = fields_breadth
-           )
-
-# Merge to main dataframe
-df = df.merge(df_breadth[['Instrument', 'Value']], left_on = 'sector_ticker_gl', right_on = 'Instrument', how='left')
-df.rename(columns = {'Value': 'breadth'}, inplace=True)
-df.drop(columns = ['Instrument'], inplace=True)
-
-
-
-
-# Create 90days past Breadth metric dataframe
-df_breadth_90past = ds.get_data(tickers = tickers_gl,
-            start = start_90, 
-            end = end_90,
-            freq = freq_d,
-            fields = fields_breadth
-           )
-
-# Merge to main dataframe
-df = df.merge(df_breadth_90past[['Instrument', 'Value']], left_on = 'sector_ticker_gl', right_on = 'Instrument', how='left')
-df.rename(columns = {'Value': 'breadth_90past'}, inplace=True)
-df.drop(columns = ['Instrument'], inplace=True)
-
-
-
-
-# Convert to string and add arrow
-df['breadth_viz'] = (df['breadth'].astype(str)
-                  + np.where(df['breadth'].gt(df['breadth_90past']), UP, DOWN)
-                   )
-
-
-
-
-############################################# 200d Rel Metric ##########################################
-
-# 200d Rel Metric Parameters
-fields_200d = ['100*(REB#(X)/MAV#(REB#(X),200D)-1.00)']
-
-# Create 200d Rel metric dataframe
-df_200d = ds.get_data(tickers = tickers,
-            start = start, 
-            end = end,
-            freq = freq_d,
-            fields = fields_200d
-           )
-
-# Merge to main dataframe
-df = df.merge(df_200d[['Instrument', 'Value']], left_on = 'sector_ticker', right_on = 'Instrument', how='left')
-df.rename(columns = {'Value': 'rel_200d'}, inplace=True)
-df.drop(columns = ['Instrument'], inplace=True)
-
-
-
-
-# Create 90 day past 200d Rel metric dataframe
-df_200d_90past = ds.get_data(tickers = tickers,
-            start = start_90, 
-            end = end_90,
-            freq = freq_d,
-            fields = fields_200d
-           )
-
-# Merge to main dataframe
-df = df.merge(df_200d_90past[['Instrument', 'Value']], left_on = 'sector_ticker', right_on = 'Instrument', how='left')
-df.rename(columns = {'Value': 'rel_200d_90past'}, inplace=True)
-df.drop(columns = ['Instrument'], inplace=True)
-
-
-
-
-
-# Convert to string and add arrow
-df['rel_200d_viz'] = (df['rel_200d'].astype(str)
-                  + np.where(df['rel_200d'].gt(df['rel_200d_90past']), UP, DOWN)
-                   )
-
-
-############################################# A/D Line Metric ##########################################
-
-# A/D Line Parameters
-fields_ad = ["100.000*MAV#(X(RS)/(X(FS)+X(RS)),1M)"]
-
-
-# Create A/D Line Rel metric dataframe
-df_ad = ds.get_data(tickers = tickers,
-            start = start, 
-            end = end,
-            freq = freq_d,
-            fields = fields_ad
-           )
-
-# Merge to main dataframe
-df = df.merge(df_ad[['Instrument', 'Value']], left_on = 'sector_ticker', right_on = 'Instrument', how='left')
-df.rename(columns = {'Value': 'ad_line'}, inplace=True)
-df.drop(columns = ['Instrument'], inplace=True)
-
-
-# Create A/D Line Rel metric dataframe
-df_ad_90past = ds.get_data(tickers = tickers,
-            start = start_90, 
-            end = end_90,
-            freq = freq_d,
-            fields = fields_ad
-           )
-
-# Merge to main dataframe
-df = df.merge(df_ad_90past[['Instrument', 'Value']], left_on = 'sector_ticker', right_on = 'Instrument', how='left')
-df.rename(columns = {'Value': 'ad_line_90past'}, inplace=True)
-df.drop(columns = ['Instrument'], inplace=True)
-
-
-
-
-# Convert to string and add arrow
-df['ad_line_viz'] = (df['ad_line'].astype(str)
-                  + np.where(df['ad_line'].gt(df['ad_line_90past']), UP, DOWN)
-                   )
-
-
-
-
-
-
-
-########################################################################################################
-#################################### CYCLYCALITY #######################################################
-########################################################################################################
-
-
-
-############################################# Sector Beta ##########################################
-
-# Metric Parameters
-fields_beta = ['REGB#(LN#(TOTMKWD/LAG#(TOTMKWD,1M)),LN#(X/LAG#(X,1M)),60M)']
-
-# Create Sector Beta metric dataframe
-df_beta = ds.get_data(tickers = tickers,
-            start = start, 
-            end = end,
-            freq = freq_m,
-            fields = fields_beta
-           )
-
-
-# Merge to main dataframe
-df = df.merge(df_beta[['Instrument', 'Value']], left_on = 'sector_ticker', right_on = 'Instrument', how='left')
-df.rename(columns = {'Value': 'beta'}, inplace=True)
-df.drop(columns = ['Instrument'], inplace=True)
-
-
-
-
-
-############################################# Rolling Corr ##########################################
-
-# Metric Parameters
-fields_corr = ['CORR#(ACH#(GXCESIR,1M),PCH#(X/TOTMKWD,1M),60M)']
-
-# Create Rolling Corr metric dataframe
-df_corr = ds.get_data(tickers = tickers,
-            start = start, 
-            end = end,
-            freq = freq_m,
-            fields = fields_corr
-           )
-
-
-# Merge to main dataframe
-df = df.merge(df_corr[['Instrument', 'Value']], left_on = 'sector_ticker', right_on = 'Instrument', how='left')
-df.rename(columns = {'Value': 'rolling_corr'}, inplace=True)
-df.drop(columns = ['Instrument'], inplace=True)
-
-
-
-
-
-
-############################################# DXY Corr ##########################################
-
-# Metric Parameters
-fields_dxy = ['CORR#(PCH#(X,4W),PCH#(NDXYSPT,4W),200D)']
-
-# Create Rolling Corr metric dataframe
-df_corr = ds.get_data(tickers = tickers,
-            start = start, 
-            end = end,
-            freq = freq_d,
-            fields = fields_dxy
-           )
-
-
-# Merge to main dataframe
-df = df.merge(df_corr[['Instrument', 'Value']], left_on = 'sector_ticker', right_on = 'Instrument', how='left')
-df.rename(columns = {'Value': 'dxy_corr'}, inplace=True)
-df.drop(columns = ['Instrument'], inplace=True)
-
-
-
-
-
-
-
-
-########################################################################################################
-#################################### EARNINGS #######################################################
-########################################################################################################
-
-
-
-
-################################# 3M Moving Avg Earnings Revision Ratio ######################################
-
-# Metric Parameters
-fields_earnings_rev_3m = ['(MAV#(PAD#((X(A12UPE)-X(A12DNE))/(X(A12UPE)+X(A12DNE))),3M))*100.00']
-
-# Create 3 Months Moving Avg Earnings Revision Ratio metric dataframe
-df_earnings_rev_3m = ds.get_data(tickers = tickers_ibes,
-            start = start, 
-            end = end,
-            freq = freq_d,
-            fields = fields_earnings_rev_3m
-           )
-
-
-# Merge to main dataframe
-df = df.merge(df_earnings_rev_3m[['Instrument', 'Value']], left_on = 'sector_ticker_ibes', right_on = 'Instrument', how='left')
-df.rename(columns = {'Value': 'earnings_rev_3m'}, inplace=True)
-df.drop(columns = ['Instrument'], inplace=True)
-
-
-
-
-
-
-################################# 90 days past 3M Moving Avg Earnings Revision Ratio ######################################
-
-# Create 90 days past 3 Months Moving Avg Earnings Revision Ratio metric dataframe
-df_earnings_rev_3m_90past = ds.get_data(tickers = tickers_ibes,
-            start = start_90, 
-            end = end_90,
-            freq = freq_d,
-            fields = fields_earnings_rev_3m
-           )
-
-
-# Merge to main dataframe
-df = df.merge(df_earnings_rev_3m_90past[['Instrument', 'Value']], left_on = 'sector_ticker_ibes', right_on = 'Instrument', how='left')
-df.rename(columns = {'Value': 'earnings_rev_3m_90past'}, inplace=True)
-df.drop(columns = ['Instrument'], inplace=True)
-
-
-
-
-# Convert to string and add arrow
-df['earnings_rev_3m_viz'] = (df['earnings_rev_3m'].astype(str)
-                  + np.where(df['earnings_rev_3m'].gt(df['earnings_rev_3m_90past']), UP, DOWN)
-                   )
-
-
-
-
-################################# EPS Growth ######################################
-
-# Metric Parameters
-fields_eps = ['PCH#(X(A12TE),1Y)']
-
-# Create 3 Months Moving Avg Earnings Revision Ratio metric dataframe
-df_eps = ds.get_data(tickers = tickers_ibes,
-            start = start, 
-            end = end,
-            freq = freq_d,
-            fields = fields_eps
-           )
-
-
-# Merge to main dataframe
-df = df.merge(df_eps[['Instrument', 'Value']], left_on = 'sector_ticker_ibes', right_on = 'Instrument', how='left')
-df.rename(columns = {'Value': 'eps'}, inplace=True)
-df.drop(columns = ['Instrument'], inplace=True)
-
-
-
-
-
-
-
-################################# 90 days past EPS Growth ######################################
-
-# Create 90 days past EPS Growth metric dataframe
-df_eps_90past = ds.get_data(tickers = tickers_ibes,
-            start = start_90, 
-            end = end_90,
-            freq = freq_d,
-            fields = fields_eps
-           )
-
-
-# Merge to main dataframe
-df = df.merge(df_eps_90past[['Instrument', 'Value']], left_on = 'sector_ticker_ibes', right_on = 'Instrument', how='left')
-df.rename(columns = {'Value': 'eps_90past'}, inplace=True)
-df.drop(columns = ['Instrument'], inplace=True)
-
-
-
-# Convert to string and add arrow
-df['eps_viz'] = (df['eps'].astype(str)
-                  + np.where(df['eps'].gt(df['eps_90past']), UP, DOWN)
-                   )
-
-
-
-
-
-
-################################# Earning Growth Expectations ######################################
-
-# Metric Parameters
-fields_earnings_growth_exp = ['X(A12GRO)']
-
-# Create Earnings Growth Expecations metric dataframe
-df_earnings_growth_exp = ds.get_data(tickers = tickers_ibes,
-            start = start, 
-            end = end,
-            freq = freq_d,
-            fields = fields_earnings_growth_exp
-           )
-
-
-# Merge to main dataframe
-df = df.merge(df_earnings_growth_exp[['Instrument', 'Value']], left_on = 'sector_ticker_ibes', right_on = 'Instrument', how='left')
-df.rename(columns = {'Value': 'earning_growth_exp'}, inplace=True)
-df.drop(columns = ['Instrument'], inplace=True)
-
-
-
-################################# 90 days past Earning Growth Expectations ######################################
-
-# Create 90 days past Earnigns Growth Expectations metric dataframe
-df_earnings_growth_exp_90past = ds.get_data(tickers = tickers_ibes,
-            start = start_90, 
-            end = end_90,
-            freq = freq_d,
-            fields = fields_earnings_growth_exp
-           )
-
-
-# Merge to main dataframe
-df = df.merge(df_earnings_growth_exp[['Instrument', 'Value']], left_on = 'sector_ticker_ibes', right_on = 'Instrument', how='left')
-df.rename(columns = {'Value': 'earning_growth_exp_90past'}, inplace=True)
-df.drop(columns = ['Instrument'], inplace=True)
-
-
-
-# Convert to string and add arrow
-df['earning_growth_exp_viz'] = (df['earning_growth_exp'].astype(str)
-                  + np.where(df['earning_growth_exp'].gt(df['earning_growth_exp_90past']), UP, DOWN)
-                   )
-
-
-
-
-
-
-
-
-################################# Sales Growth ######################################
-
-# Metric Parameters
-fields_sales_growth = ['MAV#(PCH#(X(DWSL),1Y),3M)']
-
-
-# Create Sales Growth metric dataframe
-df_sales_growth = ds.get_data(tickers = tickers,
-            start = start, 
-            end = end,
-            freq = freq_d,
-            fields = fields_sales_growth
-           )
-
-
-# Merge to main dataframe
-df = df.merge(df_sales_growth[['Instrument', 'Value']], left_on = 'sector_ticker', right_on = 'Instrument', how='left')
-df.rename(columns = {'Value': 'sales_growth'}, inplace=True)
-df.drop(columns = ['Instrument'], inplace=True)
-
-
-
-################################# 90 days past Sales Growth ######################################
-
-# Create 90 days past Sales Growth metric dataframe
-df_sales_growth_90past = ds.get_data(tickers = tickers,
-            start = start_90, 
-            end = end_90,
-            freq = freq_d,
-            fields = fields_sales_growth
-           )
-
-
-# Merge to main dataframe
-df = df.merge(df_sales_growth_90past[['Instrument', 'Value']], left_on = 'sector_ticker', right_on = 'Instrument', how='left')
-df.rename(columns = {'Value': 'sales_growth_90past'}, inplace=True)
-df.drop(columns = ['Instrument'], inplace=True)
-
-
-
-
-# Convert to string and add arrow
-df['sales_growth_viz'] = (df['sales_growth'].astype(str)
-                  + np.where(df['sales_growth'].gt(df['sales_growth_90past']), UP, DOWN)
-                   )
-
-
-
-
-
-
-
-############################################# Net Profit Margins ##########################################
-
-# Metric Parameters
-fields_netpro = ['X(DWNM)*1.00']
-
-# Create Sector Beta metric dataframe
-df_netpro = ds.get_data(tickers = tickers,
-            start = start, 
-            end = end,
-            freq = freq_d,
-            fields = fields_netpro
-           )
-
-
-# Merge to main dataframe
-df = df.merge(df_netpro[['Instrument', 'Value']], left_on = 'sector_ticker', right_on = 'Instrument', how='left')
-df.rename(columns = {'Value': 'net_profit_margin'}, inplace=True)
-df.drop(columns = ['Instrument'], inplace=True)
-
-
-############################################# 90 days Past Net Profit Margins ##########################################
-
-
-# Create Sector Beta metric dataframe
-df_netpro_90past = ds.get_data(tickers = tickers,
-            start = start_90, 
-            end = end_90,
-            freq = freq_d,
-            fields = fields_netpro
-           )
-
-
-# Merge to main dataframe
-df = df.merge(df_netpro_90past[['Instrument', 'Value']], left_on = 'sector_ticker', right_on = 'Instrument', how='left')
-df.rename(columns = {'Value': 'net_profit_margin_90past'}, inplace=True)
-df.drop(columns = ['Instrument'], inplace=True)
-
-
-
-
-# Convert to string and add arrow
-df['net_profit_margin_viz'] = (df['net_profit_margin'].astype(str)
-                  + np.where(df['net_profit_margin'].gt(df['net_profit_margin_90past']), UP, DOWN)
-                   )
-
-
-
-################################### Net Profit Margins Z Score ########################################
-
-# Metric Parameters
-fields_netpro_z = ['(X(DWNM)-AVG#(X(DWNM),-20Y,))/SDN#(X(DWNM),-20Y,)']
-
-# Create Sector Beta metric dataframe
-df_netpro_z = ds.get_data(tickers = tickers,
-            start = start, 
-            end = end,
-            freq = freq_d,
-            fields = fields_netpro_z
-           )
-
-
-# Merge to main dataframe
-df = df.merge(df_netpro_z[['Instrument', 'Value']], left_on = 'sector_ticker', right_on = 'Instrument', how='left')
-df.rename(columns = {'Value': 'net_profit_margin_zscore'}, inplace=True)
-df.drop(columns = ['Instrument'], inplace=True)
-
-
-
-
-
-################################# Dividend Yield ######################################
-
-# Metric Parameters
-fields_dividend = ['X(DY)']
-
-
-# Create Sales Growth metric dataframe
-df_dividend = ds.get_data(tickers = tickers,
-            start = start, 
-            end = end,
-            freq = freq_d,
-            fields = fields_dividend
-           )
-
-
-# Merge to main dataframe
-df = df.merge(df_dividend[['Instrument', 'Value']], left_on = 'sector_ticker', right_on = 'Instrument', how='left')
-df.rename(columns = {'Value': 'dividend'}, inplace=True)
-df.drop(columns = ['Instrument'], inplace=True)
-
-
-
-
-
-
-
-
-
-########################################################################################################
-#################################### VALUATION #######################################################
-########################################################################################################
-
-
-
-################################# P/E Ratio DataStream ######################################
-
-# Metric Parameters
-fields_pe_ds = ['X(PE)']
-
-# Create 3 Months Moving Avg Earnings Revision Ratio metric dataframe
-df_pe_ds = ds.get_data(tickers = tickers,
-            start = start, 
-            end = end,
-            freq = freq_d,
-            fields = fields_pe_ds
-           )
-
-
-# Merge to main dataframe
-df = df.merge(df_pe_ds[['Instrument', 'Value']], left_on = 'sector_ticker', right_on = 'Instrument', how='left')
-df.rename(columns = {'Value': 'pe_ds'}, inplace=True)
-df.drop(columns = ['Instrument'], inplace=True)
-
-
-
-################################# Forward P/E Ratio DataStream ######################################
-
-# Metric Parameters
-fields_fwd_pe_ds = ['X(DIPE)']
-
-# Create 3 Months Moving Avg Earnings Revision Ratio metric dataframe
-df_fwd_pe_ds = ds.get_data(tickers = tickers,
-            start = start, 
-            end = end,
-            freq = freq_d,
-            fields = fields_fwd_pe_ds
-           )
-
-
-# Merge to main dataframe
-df = df.merge(df_fwd_pe_ds[['Instrument', 'Value']], left_on = 'sector_ticker', right_on = 'Instrument', how='left')
-df.rename(columns = {'Value': 'fwd_pe_ds'}, inplace=True)
-df.drop(columns = ['Instrument'], inplace=True)
-
-
-
-
-
-
-################################# Forward P/E Ratio Z-Score DataStream ######################################
-
-# Metric Parameters
-fields_fwd_pe_ds_zscore = ['(X(DIPE)-AVG#(X(DIPE),-20Y,))/SDN#(X(DIPE),-20Y,)']
-
-# Create 3 Months Moving Avg Earnings Revision Ratio metric dataframe
-df_fwd_pe_ds_zscore = ds.get_data(tickers = tickers,
-            start = start, 
-            end = end,
-            freq = freq_d,
-            fields = fields_fwd_pe_ds_zscore
-           )
-
-
-# Merge to main dataframe
-df = df.merge(df_fwd_pe_ds_zscore[['Instrument', 'Value']], left_on = 'sector_ticker', right_on = 'Instrument', how='left')
-df.rename(columns = {'Value': 'fwd_pe_ds_zscore'}, inplace=True)
-df.drop(columns = ['Instrument'], inplace=True)
-
-
-
-
-
-
-################################# Price to Book Ratio DataStream ######################################
-
-# Metric Parameters
-fields_price_book = ['X(BP)']
-
-# Create 3 Months Moving Avg Earnings Revision Ratio metric dataframe
-df_price_book = ds.get_data(tickers = tickers,
-            start = start, 
-            end = end,
-            freq = freq_d,
-            fields = fields_price_book
-           )
-
-
-# Merge to main dataframe
-df = df.merge(df_price_book[['Instrument', 'Value']], left_on = 'sector_ticker', right_on = 'Instrument', how='left')
-df.rename(columns = {'Value': 'price_book'}, inplace=True)
-df.drop(columns = ['Instrument'], inplace=True)
-
-
-
-
-
-
-################################# Price to Book Ratio ZScore DataStream ######################################
-
-# Metric Parameters
-fields_price_book_zscore = ['(X(BP)-AVG#(X(BP),-20Y,))/SDN#(X(BP),-20Y,)']
-
-# Create 3 Months Moving Avg Earnings Revision Ratio metric dataframe
-df_price_book_zscore = ds.get_data(tickers = tickers,
-            start = start, 
-            end = end,
-            freq = freq_d,
-            fields = fields_price_book_zscore
-           )
-
-
-# Merge to main dataframe
-df = df.merge(df_price_book_zscore[['Instrument', 'Value']], left_on = 'sector_ticker', right_on = 'Instrument', how='left')
-df.rename(columns = {'Value': 'price_book_zscore'}, inplace=True)
-df.drop(columns = ['Instrument'], inplace=True)
-
-
-
-
-
-################################# Price to Cash Ratio DataStream ######################################
-
-# Metric Parameters
-fields_price_cash = ['X(PC)']
-
-# Create 3 Months Moving Avg Earnings Revision Ratio metric dataframe
-df_price_cash = ds.get_data(tickers = tickers,
-            start = start, 
-            end = end,
-            freq = freq_d,
-            fields = fields_price_cash
-           )
-
-
-# Merge to main dataframe
-df = df.merge(df_price_cash[['Instrument', 'Value']], left_on = 'sector_ticker', right_on = 'Instrument', how='left')
-df.rename(columns = {'Value': 'price_cash'}, inplace=True)
-df.drop(columns = ['Instrument'], inplace=True)
-
-
-
-
-
-################################# Price to Cash Ratio Z Score DataStream ######################################
-
-# Metric Parameters
-fields_price_cash_zscore = ['(X(PC)-AVG#(X(PC),-20Y,))/SDN#(X(PC),-20Y,)']
-
-# Create 3 Months Moving Avg Earnings Revision Ratio metric dataframe
-df_price_cash_zscore = ds.get_data(tickers = tickers,
-            start = start, 
-            end = end,
-            freq = freq_d,
-            fields = fields_price_cash_zscore
-           )
-
-
-# Merge to main dataframe
-df = df.merge(df_price_cash_zscore[['Instrument', 'Value']], left_on = 'sector_ticker', right_on = 'Instrument', how='left')
-df.rename(columns = {'Value': 'price_cash_zscore'}, inplace=True)
-df.drop(columns = ['Instrument'], inplace=True)
-
-
-
-
-
-################################# Price to Sales Ratio DataStream ######################################
-
-# Metric Parameters
-fields_price_sales = ['E062(X)']
-
-# Create 3 Months Moving Avg Earnings Revision Ratio metric dataframe
-df_price_sales = ds.get_data(tickers = tickers,
-            start = start, 
-            end = end,
-            freq = freq_d,
-            fields = fields_price_sales
-           )
-
-
-# Merge to main dataframe
-df = df.merge(df_price_sales[['Instrument', 'Value']], left_on = 'sector_ticker', right_on = 'Instrument', how='left')
-df.rename(columns = {'Value': 'price_sales'}, inplace=True)
-df.drop(columns = ['Instrument'], inplace=True)
-
-
-
-
-################################# Price to Sales Ratio ZScore DataStream ######################################
-
-# Metric Parameters
-fields_price_sales_zscore = ['(E062(X)-AVG#(E062(X),-20Y,))/SDN#(E062(X),-20Y,)']
-
-# Create 3 Months Moving Avg Earnings Revision Ratio metric dataframe
-df_price_sales_zscore = ds.get_data(tickers = tickers,
-            start = start, 
-            end = end,
-            freq = freq_d,
-            fields = fields_price_sales_zscore
-           )
-
-
-# Merge to main dataframe
-df = df.merge(df_price_sales_zscore[['Instrument', 'Value']], left_on = 'sector_ticker', right_on = 'Instrument', how='left')
-df.rename(columns = {'Value': 'price_sales_zscore'}, inplace=True)
-df.drop(columns = ['Instrument'], inplace=True)
-
-
-
-
-
-################################# Valuation ZScore ######################################
-df['valuation_zscore'] = df[['fwd_pe_ds_zscore', 
-                             'price_book_zscore', 
-                             'price_cash_zscore',
-                             'price_sales_zscore']].mean(axis=1)
-
-
-
-
-
-################################# Tupper Fwd PE ######################################
-
-# Metric Parameters
-fields_tupper_fwd_pe = ['REBE#(X/TOTMKWD,MTE)-(REBE#(X/TOTMKWD,MTE))/(X(DIPE)/TOTMKWD(DIPE))']
-
-# Create 3 Months Moving Avg Earnings Revision Ratio metric dataframe
-df_tupper_fwd_pe = ds.get_data(tickers = tickers,
-            start = start, 
-            end = end,
-            freq = freq_d,
-            fields = fields_tupper_fwd_pe
-           )
-
-
-# Merge to main dataframe
-df = df.merge(df_tupper_fwd_pe[['Instrument', 'Value']], left_on = 'sector_ticker', right_on = 'Instrument', how='left')
-df.rename(columns = {'Value': 'tupper_fwd_pe'}, inplace=True)
-df.drop(columns = ['Instrument'], inplace=True)
 
 
 
 
+##############################################
+######## Fetch Parameters
+##############################################
 
-################################# 90 days Past Tupper Fwd PE ######################################
+# Fetch mode: 'single' (one call per metric), 'grouped' (one call per group) or 'bundle' (GetDataBundle posts)
+fetch_mode = "bundle"
 
+# Maximum number of DSWS requests in flight at once
+fetch_workers = 4
 
-# Create 3 Months Moving Avg Earnings Revision Ratio metric dataframe
-df_tupper_fwd_pe_90past = ds.get_data(tickers = tickers,
-            start = start_90, 
-            end = end_90,
-            freq = freq_d,
-            fields = fields_tupper_fwd_pe
-           )
+# Times a request is sent again when DSWS returns nothing
+fetch_retries = 2
 
+# Shared result cache: seconds before an entry expires and maximum number of entries
+cache_ttl = 15 * 60
+cache_max_entries = 1024
 
-# Merge to main dataframe
-df = df.merge(df_tupper_fwd_pe_90past[['Instrument', 'Value']], left_on = 'sector_ticker', right_on = 'Instrument', how='left')
-df.rename(columns = {'Value': 'tupper_fwd_pe_90past'}, inplace=True)
-df.drop(columns = ['Instrument'], inplace=True)
+# Snapshot store directory and the age (seconds) after which today's snapshot is rebuilt
+snapshot_dir = os.environ.get('DASHBOARD_SNAPSHOT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'snapshots'))
+snapshot_max_age = 60 * 60
 
+# Compute the 20-year z-scores locally from cached raw series instead of AVG#/SDN# expressions
+local_zscores = True
 
+# Evaluate every supported DS expression locally from base series fetched once
+local_expressions = True
 
+# A stored snapshot up to this many days before the chosen as-of date is shown instead of backfilling it
+as_of_tolerance_days = 3
 
-# Convert to string and add arrow
-df['tupper_fwd_pe_viz'] = (df['tupper_fwd_pe'].astype(str)
-                  + np.where(df['tupper_fwd_pe'].gt(df['tupper_fwd_pe_90past']), UP, DOWN)
-                   )
+# Hidden admin panel with fetch and stage timings, shown with ?admin=1
+show_admin = st.query_params.get('admin') == '1'
 
+# Profile one full build with cProfile on ?profile=1 or DASHBOARD_PROFILE=1, writing .prof files to profile_dir
+profile_run = st.query_params.get('profile') == '1' or os.environ.get('DASHBOARD_PROFILE', '0') == '1'
+profile_dir = os.environ.get('DASHBOARD_PROFILE_DIR', os.path.join(snapshot_dir, 'profiles'))
 
+if profile_run:
+    # The profiler sees the script thread only, so fetch on it and rebuild rather than load today's snapshot
+    profiler = start_profile()
+    fetch_workers = 1
 
 
 
 
 
 ########################################################################################################
-#################################### OPERATIONS #######################################################
+#################################### SNAPSHOT ##########################################################
 ########################################################################################################
 
+# One result cache per process, shared by every Streamlit session
+@st.cache_resource
+def get_result_cache():
+    return ResultCache(ttl = cache_ttl, max_entries = cache_max_entries)
 
 
-############################################# Return on Equity ##########################################
-
-# Metric Parameters
-fields_reteq = ['X(DWRE)']
-
-# Create Sector Beta metric dataframe
-df_reteq = ds.get_data(tickers = tickers,
-            start = start, 
-            end = end,
-            freq = freq_d,
-            fields = fields_reteq
-           )
+# Per-metric fetch and stage timings of this process, also logged as JSON on 'dashboard.timing'.
+# Streamlit only configures its own loggers, so the timing log gets its own stderr handler at INFO.
+@st.cache_resource
+def get_fetch_stats():
+    timing_log = logging.getLogger('dashboard.timing')
+    if not timing_log.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(name)s %(levelname)s %(message)s"))
+        timing_log.addHandler(handler)
+        timing_log.propagate = False
+    timing_log.setLevel(logging.INFO)
+    return FetchStats()
 
 
-# Merge to main dataframe
-df = df.merge(df_reteq[['Instrument', 'Value']], left_on = 'sector_ticker', right_on = 'Instrument', how='left')
-df.rename(columns = {'Value': 'return_on_equity'}, inplace=True)
-df.drop(columns = ['Instrument'], inplace=True)
+def fetch_upstream(metric_requests, on_result=None):
+    if fetch_async:
+        return run_fetch(username, password, metric_requests, mode = fetch_mode, max_concurrency = fetch_workers,
+                         retries = fetch_retries, stats = get_fetch_stats(), on_result = on_result)
+    return fetch_metrics(get_datastream(), metric_requests, mode = fetch_mode, max_workers = fetch_workers,
+                         retries = fetch_retries, stats = get_fetch_stats(), on_result = on_result)
 
 
+def fetch_cached(metric_requests, on_result=None):
+    return get_result_cache().fetch(metric_requests, fetch_upstream, stats = get_fetch_stats(), on_result = on_result)
 
-############################################# Return on Equity Z Score ########################################
 
-# Metric Params
-fields_reteq_z = ['(X(DWRE)-AVG#(X(DWRE),-20Y,))/SDN#(X(DWRE),-20Y,)']
+# One snapshot store per process
+@st.cache_resource
+def get_snapshot_store():
+    return SnapshotStore(snapshot_dir)
 
-# Create Sector Beta metric dataframe
-df_reteq_z = ds.get_data(tickers = tickers,
-            start = start, 
-            end = end,
-            freq = freq_d,
-            fields = fields_reteq_z
-           )
 
+# One history cube per process: every published snapshot appended as a date slice
+@st.cache_resource
+def get_history_cube():
+    return HistoryCube(os.path.join(snapshot_dir, 'cube'))
 
-# Merge to main dataframe
-df = df.merge(df_reteq_z[['Instrument', 'Value']], left_on = 'sector_ticker', right_on = 'Instrument', how='left')
-df.rename(columns = {'Value': 'return_on_equity_zscore'}, inplace=True)
-df.drop(columns = ['Instrument'], inplace=True)
 
+# One sparkline cache per process: pre-rendered SVG per (metric, sector, as-of) from the history cube
+@st.cache_resource
+def get_sparkline_cache():
+    return SparklineCache()
 
 
+# One rendered-table cache per process: table HTML by snapshot content hash
+@st.cache_resource
+def get_table_cache():
+    return TableCache()
 
-############################################# Operating Margins ##########################################
 
-# Metric Parameters
-fields_opmrg = ['X(DWEB)/X(DWSL)*100.00']
+def fetch_series_upstream(tickers, fields, start, end):
+    return fetch_series(get_datastream(), tickers, fields, start, end)
 
-# Create Sector Beta metric dataframe
-df_opmrg = ds.get_data(tickers = tickers,
-            start = start, 
-            end = end,
-            freq = freq_d,
-            fields = fields_opmrg
-           )
 
+# One z-score engine per process, reading the raw 20-year series from the base series store
+@st.cache_resource
+def get_zscore_engine():
+    return ZScoreEngine(get_series_store())
 
-# Merge to main dataframe
-df = df.merge(df_opmrg[['Instrument', 'Value']], left_on = 'sector_ticker', right_on = 'Instrument', how='left')
-df.rename(columns = {'Value': 'ops_margin'}, inplace=True)
-df.drop(columns = ['Instrument'], inplace=True)
 
+# One sector correlation matrix per process, updated with each new day of returns instead of refitted
+@st.cache_resource
+def get_correlation_engine():
+    return RollingCorrelationMatrix(CORRELATION_WINDOW)
 
 
+# One set of rolling beta / correlation engines per process, updated with each new day instead of refitted
+@st.cache_resource
+def get_regression_engines():
+    return RollingRegressions()
 
-################################# Operating Margins Z Score ######################################
 
-# Metric Parameters
-fields_opmrg_z = ['(E063(X)-AVG#(E063(X),-20Y,))/SDN#(E063(X),-20Y,)']
+# One base series store per process: every raw series local expressions read, fetched in full once
+# and then only its new days
+@st.cache_resource
+def get_series_store():
+    return SeriesStore(os.path.join(snapshot_dir, 'base_series'), fetch_series_upstream)
 
-# Create Sector Beta metric dataframe
-df_opmrg_z = ds.get_data(tickers = tickers,
-            start = start, 
-            end = end,
-            freq = freq_d,
-            fields = fields_opmrg_z
-           )
 
 
-# Merge to main dataframe
-df = df.merge(df_opmrg_z[['Instrument', 'Value']], left_on = 'sector_ticker', right_on = 'Instrument', how='left')
-df.rename(columns = {'Value': 'ops_margin_zscore'}, inplace=True)
-df.drop(columns = ['Instrument'], inplace=True)
 
+# Seconds spent in each stage of this run
+timings = {}
 
+# Placeholder the table is drawn into while today's snapshot builds
+table = None
 
+# As-of date: today renders the live snapshot, earlier dates render stored snapshots
+today = dt.today().strftime('%Y-%m-%d')
+selected = st.sidebar.date_input("As of", value = dt.today(), max_value = dt.today()).strftime('%Y-%m-%d')
 
 
+if selected != today:
+    # Nearest stored snapshot on or before the chosen date, backfilled from DSWS when there is none close enough
+    as_of = get_snapshot_store().nearest(selected)
+    if as_of is None or (pd.Timestamp(selected) - pd.Timestamp(as_of)).days > as_of_tolerance_days:
+        if use_refresher:
+            st.info(f"No snapshot stored for {selected}. Backfill it with refresher.py --backfill.")
+            st.stop()
+        with st.spinner(f"Backfilling {selected} from Datastream"):
+            snapshots = backfill_snapshots(fetch_cached, [selected],
+                                           fetch_series = get_series_store() if local_expressions and not fetch_async else None)
+        for as_of, snapshot in snapshots.items():
+            get_snapshot_store().save(as_of, snapshot)
+            get_history_cube().append(as_of, snapshot.frame)
+        as_of = selected
 
+    snapshot = get_snapshot_store().load(as_of)
+    st.caption(f"Historical view as of {as_of}")
+elif use_refresher:
+    # Render the latest snapshot published by the background refresher
+    as_of = get_snapshot_store().latest()
+    snapshot = get_snapshot_store().load(as_of) if as_of else None
 
-############################################# Operations ZScore ##########################################
-df['operations_zscore'] = df[['return_on_equity_zscore', 
-                              'net_profit_margin_zscore', 
-                              'ops_margin_zscore']].mean(axis=1)
+    if snapshot is None:
+        st.info("Waiting for the refresher to publish the first snapshot.")
+        st.stop()
+else:
+    # Serve today's stored snapshot if fresh, otherwise fetch, assemble and store it
+    as_of = today
+    snapshot = get_snapshot_store().load(as_of, max_age = snapshot_max_age) if not profile_run else None
 
+    if snapshot is None:
+        # Fetch all metrics in grouped multi-field requests, serving cached results first.
+        # A skeleton of the table is drawn straight away and each group filled in as its data lands.
+        table = st.empty()
+        snapshot = build_snapshot(fetch_cached,
+                                  zscores = get_zscore_engine() if local_zscores and not fetch_async else None,
+                                  fetch_series = get_series_store() if local_expressions and not fetch_async else None,
+                                  timings = timings,
+                                  correlation_engine = get_correlation_engine(),
+                                  regressions = get_regression_engines(),
+                                  progress = lambda frame, improved: table.html(pending_table(frame, improved).to_html()))
+        get_snapshot_store().save(as_of, snapshot)
+        get_history_cube().append(as_of, snapshot.frame)
 
 
 
 
-################################# Market Cap ######################################
 
+######################################################################################
+################### Format Output
+######################################################################################
 
-# Metric Parameters
-fields_mkt_cap = ['(X(MV)/TOTMKWD(MV))*100.00']
-
-
-# Create 3 Months Moving Avg Earnings Revision Ratio metric dataframe
-df_mkt_cap = ds.get_data(tickers = tickers,
-            start = start, 
-            end = end,
-            freq = freq_d,
-            fields = fields_mkt_cap
-           )
-
+# One-year sparklines, rendered once per (metric, as-of) and reused until the cube gains a date in the window.
+# The styled table is rendered to HTML once per distinct snapshot content and served from the cache after that.
+with stage(timings, 'style'):
+    sparklines = get_sparkline_cache().render(get_history_cube(), sparkline_metrics(), as_of)
+    result = get_table_cache().html(snapshot.frame, snapshot.improved, sparklines)
 
-# Merge to main dataframe
-df = df.merge(df_mkt_cap[['Instrument', 'Value']], left_on = 'sector_ticker', right_on = 'Instrument', how='left')
-df.rename(columns = {'Value': 'mkt_cap'}, inplace=True)
-df.drop(columns = ['Instrument'], inplace=True)
+ 
+# # CSS to inject contained in a string
+# hide_table_row_index = """
+#             <style>
+#             thead tr th:first-child {display:none}
+#             tbody th {display:none}
+#             </style>
+#             """
 
+# # Inject CSS with Markdown
+# st.markdown(hide_table_row_index, unsafe_allow_html=True)
 
 
+#st.dataframe(result, use_container_width=True)
+with stage(timings, 'render'):
+    (table if table is not None else st).html(result)
 
-########################################################################################################
-#################################### POST PROCESSING ###################################################
-########################################################################################################
+get_fetch_stats().stages(timings)
 
-# Post Processing
-df.index=df['sector']
+if profile_run:
+    profile_path, profile_hotspots = finish_profile(profiler, profile_dir)
+    with st.expander("Build Profile", expanded = True):
+        st.caption(f"Written to {profile_path} (open with snakeviz or flameprof)")
+        st.dataframe(profile_hotspots.style.format(precision = 4), use_container_width = True)
+        with open(profile_path, 'rb') as f:
+            st.download_button("Download .prof", f.read(), file_name = os.path.basename(profile_path))
 
 
-df = df[['mkt_cap', 
-         'mtd_performance', 'ytd_performance', '1y_performance', '3y_cagr',
-         'rsi_14', 'breadth_viz', 'rel_200d_viz', 'ad_line_viz',
-         'beta', 'rolling_corr', 'dxy_corr',
-         'earnings_rev_3m_viz', 'eps_viz', 'earning_growth_exp_viz', 'sales_growth_viz', 'net_profit_margin_viz',
-         'dividend',
-         'pe_ds', 'fwd_pe_ds', 'price_book', 'price_cash', 'price_sales', 'valuation_zscore',
-         'tupper_fwd_pe_viz',
-         'return_on_equity', 'net_profit_margin', 'ops_margin', 'operations_zscore']]
 
-def get_super(x):
-    normal = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+-=()"
-    super_s = "ᴬᴮᶜᴰᴱᶠᴳᴴᴵᴶᴷᴸᴹᴺᴼᴾQᴿˢᵀᵁⱽᵂˣʸᶻᵃᵇᶜᵈᵉᶠᵍʰᶦʲᵏˡᵐⁿᵒᵖ۹ʳˢᵗᵘᵛʷˣʸᶻ⁰¹²³⁴⁵⁶⁷⁸⁹⁺⁻⁼⁽⁾"
-    res = x.maketrans(''.join(normal), ''.join(super_s))
-    return x.translate(res)
 
 
 
 
+######################################################################################
+################### Sector Correlation Heatmap
+######################################################################################
 
-# Rename Index
-df.index.name = None
+def correlation_color(v):
+    # White at zero, shading to green towards +1 and red towards -1
+    if pd.isna(v):
+        return ''
+    shade = int(255 * (1 - min(abs(v), 1.0)))
+    return f"background-color: rgb({shade},255,{shade});" if v >= 0 else f"background-color: rgb(255,{shade},{shade});"
 
 
-# Rename Columns
-df.columns = pd.MultiIndex.from_tuples([
-                                  ('', 'Market Cap (%)'),
-                                  ('Performance', 'MTD (%)'), 
-                                  ('Performance', 'YTD (%)'), 
-                                  ('Performance', '1-Year (%)'), 
-                                  ('Performance', '3Yr CAGR (%)'), 
-                                  ('Technicals', '14-Day RSI'), 
-                                  ('Technicals', 'Breadth' + get_super("+") + ' (%)'), 
-                                  ('Technicals', 'Rel. to 200Day (%)'), 
-                                  ('Technicals', 'Advance/Decline Line'), 
-                                  ('Cyclicality', 'Sector Beta'),
-                                  ('Cyclicality', 'Citi Eco. Surprice Corr. to Rel. Per.'),
-                                  ('Cyclicality', 'DXY Correlation'),
-                                  ('Earnings', 'Earnings Revision Ratio' + get_super("++")),
-                                  ('Earnings', 'EPS Growth (YoY) (%)'),
-                                  ('Earnings', '12-Mth Fwd EPS Growth Exp. (%)'),
-                                  ('Earnings', 'Sales Growth (YoY) (%)'),
-                                  ('Earnings', 'Profit Margin (%)'),
-                                  ('', 'Dividend Yield'),
-                                  ('Valuation', 'Price Earnings'),
-                                  ('Valuation', 'Forward PE'),
-                                  ('Valuation', 'Price to Book'),
-                                  ('Valuation', 'Price to Cash'),
-                                  ('Valuation', 'Price to Sales'),
-                                  ('Valuation', 'Valuation Z-Score'),
-                                  ('', 'Tupper Pre./Dis/ (%)'),
-                                  ('Operations', 'Return on Equity (%)'),
-                                  ('Operations', 'Net Profit Margin (%)'),
-                                  ('Operations', 'Operating Margin (%)'),
-                                  ('Operations', 'Operation Z-Score')])
+if snapshot.correlations is not None:
+    with st.expander(f"Sector Correlation ({CORRELATION_WINDOW}-Day Returns)"):
+        st.table(snapshot.correlations.style.format(precision = 2).map(correlation_color))
 
 
-df = df.T
+# Full rolling beta / correlation paths behind today's figures, kept by the regression engines
+if snapshot.histories:
+    with st.expander("Beta & Correlation History"):
+        names = {metric.name: metric.label for metric in REGISTRY if metric.name in snapshot.histories}
+        chosen = st.selectbox("Metric", list(names), format_func = names.get)
+        st.line_chart(snapshot.histories[chosen])
 
 
 
 
 
 ######################################################################################
-################### Format Output
+################### Admin Panel
 ######################################################################################
 
-def make_pretty(styler):
-    # Set Decimal Precision
-    styler.format(precision=1)
-    
-    
-    # Create Title
-    caption_styles = [dict(selector="caption",
-            props=[("text-align", "centre"),
-                   ("font-size", "120%"),
-                   ("color", 'black'),
-                  ('caption-side', 'top')])]
-    
-    styler.set_caption("Global Equity Sector Dashboard [Source: Refinitiv DataStream, Acorn MC Ltd]").set_table_styles(caption_styles, overwrite=False)
-    
-    
-    # Create border for entire table
-    styler.set_table_styles([{'selector' : '',
-                            'props' : [('border','1px solid black')]}], overwrite=False)
-    
-    # Background color for all rows
-    styler.set_table_styles([{'selector': 'td',
-                              'props': [('background-color', 'white')]}], overwrite=False)
-    
-    # Set border color between columns
-    styler.set_table_styles([
-        {'selector': 'td', 'props': 'border-left: 1px solid black'},
-        {'selector': 'td', 'props': 'border-right: 1px solid black'}
-    ]
-    , overwrite=False, axis=0)
-    
-    # Background color for column headers and row index
-    styler.set_table_styles([
-        {'selector': 'th:not(.index_name)', 'props': 'background-color: #CCCEE7; color: black;'}
-    ], overwrite=False)
-    
-    
-    # Set border color between headers
-    styler.set_table_styles({("Technology"): [
-        {'selector': 'th', 'props': 'border-left: 1px solid black'},
-        {'selector': 'th', 'props': 'border-right: 1px solid black'},
-    ]}, overwrite=False, axis=0)
-    
-    styler.set_table_styles({("Consumer Discretionary"): [
-        {'selector': 'th', 'props': 'border-left: 1px solid black'},
-        {'selector': 'th', 'props': 'border-right: 1px solid black'},
-    ]}, overwrite=False, axis=0)
-    
-    
-    styler.set_table_styles({("Healthcare"): [
-        {'selector': 'th', 'props': 'border-left: 1px solid black'},
-        {'selector': 'th', 'props': 'border-right: 1px solid black'},
-    ]}, overwrite=False, axis=0)
-    
-    styler.set_table_styles({("Energy"): [
-        {'selector': 'th', 'props': 'border-left: 1px solid black'},
-        {'selector': 'th', 'props': 'border-right: 1px solid black'},
-    ]}, overwrite=False, axis=0)
-    
-    styler.set_table_styles({("Telecom"): [
-        {'selector': 'th', 'props': 'border-left: 1px solid black'},
-        {'selector': 'th', 'props': 'border-right: 1px solid black'},
-    ]}, overwrite=False, axis=0)
-    
-    styler.set_table_styles({("Real Estate"): [
-        {'selector': 'th', 'props': 'border-left: 1px solid black'},
-        {'selector': 'th', 'props': 'border-right: 1px solid black'},
-    ]}, overwrite=False, axis=0)
-    
-    
-    
-    
-    def index_level0(s):
-        return np.where(s.isin(['Performance', 'Cyclicality','']), 
-                        "border-bottom: 1px solid black; border-top: 1px solid black;", "")
-    
-    styler.apply_index(index_level0)  
-    
-    
-    def index_level1_bottom(s):
-        return np.where(s.isin(['Market Cap (%)', '3Yr CAGR (%)', 'Advance/Decline Line','DXY Correlation', 
-                                'Profit Margin (%)','Dividend Yield', 'Valuation Z-Score', 
-                                'Tupper Pre./Dis/ (%)', 'Operation Z-Score']), 
-                        "border-bottom: 1px solid black;", "")
-    styler.apply_index(index_level1_bottom)
-    
-    
-    def index_level1_top(s):
-        return np.where(s.isin(['Market Cap (%)']), 
-                        "border-top: 1px solid black;", "")
-    styler.apply_index(index_level1_top)
-    
-    
-    
-    
-    return styler
-    
-
-result = df.style.pipe(make_pretty)
-
- 
-# # CSS to inject contained in a string
-# hide_table_row_index = """
-#             <style>
-#             thead tr th:first-child {display:none}
-#             tbody th {display:none}
-#             </style>
-#             """
-
-# # Inject CSS with Markdown
-# st.markdown(hide_table_row_index, unsafe_allow_html=True)
-
-
-#st.dataframe(result, use_container_width=True)
-st.table(result)
-
-
+# Slowest metrics and stages with their p50 / p95 history, from this process's fetch statistics
+if show_admin:
+    st.divider()
+    st.subheader("Fetch Timings")
+    fetches = get_fetch_stats().summary('fetch')
+    stages = get_fetch_stats().summary('stage')
+
+    st.caption("Slowest metrics (seconds per upstream call, mean result bytes and rows, cache hit rate, retries)")
+    st.dataframe(fetches.head(20).style.format(precision = 3), use_container_width = True)
+    st.caption("Pipeline stages (seconds)")
+    st.dataframe(stages.style.format(precision = 3), use_container_width = True)
+
+    st.caption("Upstream fetch latency p50 / p95 per hour")
+    st.line_chart(get_fetch_stats().history('fetch'))
+    st.caption("Stage time p50 / p95 per hour")
+    st.line_chart(get_fetch_stats().history('stage'))
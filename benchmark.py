@@ -0,0 +1,161 @@
+###########################################
+########## Package Imports
+###########################################
+import argparse, json, multiprocessing, os, resource, subprocess, tempfile, time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime as dt
+import pandas as pd
+from fake_dsws import serve, connect_sync
+from ds_fetch import fetch_metrics, fetch_series
+from dashboard_data import build_snapshot, sector_universe, stage
+from dashboard_style import add_trend_arrows, display_frame, make_pretty
+from series_store import SeriesStore
+from zscore import ZScoreEngine
+
+
+
+
+
+##############################################
+######## Synthetic Universes
+##############################################
+
+def synthetic_universe(size):
+    # The 11 sectors, then synthetic instruments up to size rows
+    universe = sector_universe()
+    numbers = range(len(universe), size)
+    extra = pd.DataFrame({'sector': [f"Synthetic {i:04d}" for i in numbers],
+                          'sector_ticker': [f"SYN{i:04d}WD" for i in numbers],
+                          'sector_ticker_gl': [f"G#LSYN{i:04d}WD" for i in numbers],
+                          'sector_ticker_ibes': [f"@:SYN{i:04d}" for i in numbers]})
+    return pd.concat([universe, extra[universe.columns]], ignore_index = True).head(size)
+
+
+
+
+
+##############################################
+######## Benchmark Run
+##############################################
+
+def run_build(url, size, mode, workers, local):
+    # One full page build against the fake DSWS server at url: fetch -> assemble -> make_pretty -> HTML.
+    # Runs in its own process so the peak RSS belongs to this build and the server doesn't share its GIL.
+    ds = connect_sync(url)
+    timings = {}
+    with tempfile.TemporaryDirectory() as root:
+        upstream = lambda tickers, fields, start, end: fetch_series(ds, tickers, fields, start, end)
+        series = SeriesStore(os.path.join(root, 'base_series'), upstream) if local else None
+        zscores = ZScoreEngine(series) if local else None
+
+        started = time.perf_counter()
+        snapshot = build_snapshot(lambda metric_requests: fetch_metrics(ds, metric_requests, mode = mode, max_workers = workers),
+                                  zscores = zscores, fetch_series = series, universe = synthetic_universe(size), timings = timings)
+        with stage(timings, 'style'):
+            styler = display_frame(snapshot.frame).style.pipe(make_pretty).pipe(add_trend_arrows, snapshot.improved)
+        with stage(timings, 'render'):
+            html = styler.to_html()
+        wall = time.perf_counter() - started
+
+    return dict(size = size,
+                wall = round(wall, 3),
+                peak_rss_mb = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+                html_bytes = len(html),
+                stages = {name: round(seconds, 3) for name, seconds in timings.items()})
+
+
+
+
+def benchmark(size, latency, mode, workers, local):
+    # Serve from this process, build in a fresh one; requests and bytes include the login
+    server, url = serve(latency = latency)
+    try:
+        with ProcessPoolExecutor(max_workers = 1, mp_context = multiprocessing.get_context('spawn')) as executor:
+            result = executor.submit(run_build, url, size, mode, workers, local).result()
+    finally:
+        server.shutdown()
+    handler = server.RequestHandlerClass
+    return dict(result, requests = handler.request_count, bytes = handler.bytes_sent)
+
+
+
+
+def code_version():
+    # Commit the benchmark ran against, marked dirty when the tree has local changes
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output = True, text = True,
+                              cwd = os.path.dirname(os.path.abspath(__file__)), check = True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+
+
+
+##############################################
+######## Stored Results
+##############################################
+
+def load_results(path):
+    try:
+        with open(path) as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+
+
+def previous_result(results, settings, size):
+    # Latest stored result for the same settings and universe size
+    for record in reversed(results):
+        if record['settings'] == settings:
+            for result in record['results']:
+                if result['size'] == size:
+                    return record['version'], result
+    return None, None
+
+
+
+
+def report(record, stored):
+    # One line per universe size, with the change against the last stored run of the same settings
+    print(f"{'size':>6} {'wall s':>8} {'requests':>9} {'MB recv':>8} {'peak MB':>8}  stages")
+    for result in record['results']:
+        stages = ' '.join(f"{name}={seconds:.2f}" for name, seconds in result['stages'].items())
+        line = (f"{result['size']:>6} {result['wall']:>8.2f} {result['requests']:>9} {result['bytes'] / 2**20:>8.1f} "
+                f"{result['peak_rss_mb']:>8.0f}  {stages}")
+        version, before = previous_result(stored, record['settings'], result['size'])
+        if before:
+            line += f"  [{(result['wall'] / before['wall'] - 1) * 100:+.0f}% wall, {result['requests'] - before['requests']:+d} requests vs {version}]"
+        print(line)
+
+
+
+
+
+##############################################
+######## Benchmark Suite
+##############################################
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "Benchmark a full dashboard build against a fake Datastream server")
+    parser.add_argument('--sizes', type = int, nargs = '+', default = [11, 100, 1000], help = "instruments in each universe")
+    parser.add_argument('--latency', type = float, default = 0.5, help = "seconds every fake DSWS request takes")
+    parser.add_argument('--mode', default = 'bundle')
+    parser.add_argument('--workers', type = int, default = 4)
+    parser.add_argument('--no-local', action = 'store_true', help = "fetch every expression server-side instead of evaluating locally")
+    parser.add_argument('--results', default = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks', 'results.jsonl'))
+    parser.add_argument('--no-save', action = 'store_true', help = "report without storing the results")
+    args = parser.parse_args()
+
+    settings = dict(latency = args.latency, mode = args.mode, workers = args.workers, local = not args.no_local)
+    results = [benchmark(size, args.latency, args.mode, args.workers, not args.no_local) for size in args.sizes]
+
+    record = dict(timestamp = dt.now().isoformat(timespec = 'seconds'), version = code_version(), settings = settings, results = results)
+    report(record, load_results(args.results))
+
+    if not args.no_save:
+        os.makedirs(os.path.dirname(args.results), exist_ok = True)
+        with open(args.results, 'a') as f:
+            f.write(json.dumps(record) + '\n')
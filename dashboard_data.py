@@ -0,0 +1,425 @@
+###########################################
+########## Package Imports
+###########################################
+import math, time
+from contextlib import contextmanager
+import pandas as pd, numpy as np
+from ds_fetch import MetricRequest, merge_results
+from ds_expr import Evaluator, is_local, leaves, lookback, parse, range_dependent
+from rolling import RollingCorrelationMatrix
+from metrics import REGISTRY, fetched_metrics, derived_metrics, zscore_metrics
+from snapshot_store import Snapshot
+
+
+
+
+
+#####################################################################################
+######################### Initialise Mappings ##############################
+#####################################################################################
+
+# Sector Name to Sector DS code mapping
+dict_sectors = {
+    "Technology": "TECNOWD",
+    "Financials": "FINANWD",
+    "Consumer Discretionary": "CNDISWD",
+    "Industrials": "INDUSWD",
+    "Healthcare": "HLTHCWD",
+    "Consumer Staples": "COSTPWD",
+    "Energy": "ENEGYWD",
+    "Basic Materials": "BMATRWD",
+    "Telecom": "TELCMWD",
+    "Utilities": "UTILSWD",
+    "Real Estate": "RLESTWD"
+}
+
+# Sector Name to IBES Code Mapping
+dict_ibes = {
+    "Technology": "@:AFM1IT",
+    "Financials": "@:AFM1FN",
+    "Consumer Discretionary": "@:AFM1CD",
+    "Industrials": "@:AFM1ID",
+    "Healthcare": "@:AFM1HC",
+    "Consumer Staples": "@:AFM1CS",
+    "Energy": "@:AFM1E1",
+    "Basic Materials": "@:AFM1M1",
+    "Telecom": "@:AFM1T1",
+    "Utilities": "@:AFM1U1",
+    "Real Estate": "@:AFM1RE" #"@:AFM2R2"
+}
+
+
+
+
+
+# Sector Names List
+input_sectors = ['Technology', 'Financials', 'Consumer Discretionary', 'Industrials', 'Healthcare',
+                 'Consumer Staples', 'Energy', 'Basic Materials', 'Telecom', 'Utilities', 'Real Estate']
+
+
+
+# Initialise Parameters
+start = "-0d"
+end = "-0d"
+start_90 = '-90d'
+freq_d = "D"
+freq_m = "M"
+
+
+
+
+#####################################################################################
+######################### Sector Universe ##############################
+#####################################################################################
+
+# Universe columns a metric can take its tickers from
+UNIVERSE_COLUMNS = ['sector_ticker', 'sector_ticker_gl', 'sector_ticker_ibes']
+
+
+def sector_universe():
+    # Create empty data frame
+    df = pd.DataFrame(input_sectors, columns = ['sector'])
+
+    # Create DS Sector Codes column
+    df['sector_ticker'] = df['sector'].map(dict_sectors)
+
+    # Create G#L modified DS sector codes column
+    df['sector_ticker_gl'] = 'G#L' + df['sector_ticker']
+
+    # Create IBES ticker codes column
+    df['sector_ticker_ibes'] = df['sector'].map(dict_ibes)
+    return df
+
+
+
+
+def universe_tickers(df):
+    # Create Tickers for each universe column
+    return {column: ','.join(df[column].to_list()) for column in UNIVERSE_COLUMNS}
+
+
+
+
+def make_fetch_plan(df, registry=REGISTRY, skip=(), dates=None):
+    tickers = universe_tickers(df)
+
+    # Every metric expression on today's date; trend metrics fetch the whole daily range from 90 days ago
+    # in one request, and slice_endpoints() takes both values from it.
+    # For past dates, every metric is one range request covering all of them (and 90 days before for trends).
+    # Range-dependent expressions (REB#/REBE#) can't be sliced from a range: every value is its own single-date request.
+    plan = []
+    for metric in fetched_metrics(registry):
+        if metric.name in skip:
+            continue
+        freq = freq_m if metric.freq == 'M' else freq_d
+        if range_dependent(metric.field):
+            for name, date in endpoint_dates(metric, dates):
+                plan.append(MetricRequest(name, metric.field, tickers[metric.universe], date, date, freq))
+        elif dates is not None:
+            first = min(dates) - pd.Timedelta(days = 90 if metric.compare_90d else 0)
+            plan.append(MetricRequest(metric.name, metric.field, tickers[metric.universe],
+                                      first.strftime('%Y-%m-%d'), max(dates).strftime('%Y-%m-%d'), freq))
+        elif metric.compare_90d:
+            plan.append(MetricRequest(metric.name, metric.field, tickers[metric.universe], start_90, end, freq))
+        else:
+            plan.append(MetricRequest(metric.name, metric.field, tickers[metric.universe], start, end, freq))
+    return plan
+
+
+
+
+def endpoint_dates(metric, dates=None):
+    # (result name, date) of every single value a metric shows: today and 90 days ago, or each past as-of date
+    # (and 90 days before it), past results named '<name>@<YYYY-MM-DD>'
+    if dates is None:
+        return [(metric.name, start)] + ([(metric.name + '_90past', start_90)] if metric.compare_90d else [])
+    endpoints = []
+    for as_of in dates:
+        key = as_of.strftime('%Y-%m-%d')
+        endpoints.append((f"{metric.name}@{key}", key))
+        if metric.compare_90d:
+            endpoints.append((f"{metric.name}_90past@{key}", (as_of - pd.Timedelta(days = 90)).strftime('%Y-%m-%d')))
+    return endpoints
+
+
+
+
+def slice_endpoints(metric_data, registry=REGISTRY, as_of=None):
+    # Split every fetched range into the value on as_of (default today) and, for trend metrics, 90 days before
+    as_of = pd.Timestamp(as_of) if as_of is not None else pd.Timestamp.today().normalize()
+    past = as_of - pd.Timedelta(days = 90)
+
+    sliced = {name: result for name, result in metric_data.items() if '@' not in name}
+    for metric in fetched_metrics(registry):
+        # Single-date results of past as-of dates, fetched per date by make_fetch_plan()
+        key = as_of.strftime('%Y-%m-%d')
+        for name in (metric.name, metric.name + '_90past'):
+            if f"{name}@{key}" in metric_data:
+                sliced[name] = metric_data[f"{name}@{key}"]
+
+        result = metric_data.get(metric.name)
+        if result is None or 'Dates' not in result.columns:
+            continue
+        result = result.assign(Dates = pd.to_datetime(result['Dates'])).sort_values('Dates', kind = 'stable')
+        result = result[result['Dates'] <= as_of]
+        by_instrument = result.groupby('Instrument', sort = False)['Value']
+        sliced[metric.name] = by_instrument.last().reset_index()
+
+        # The last value on or before the 90-day date (the first in the range when that date fell on a non-trading day)
+        if metric.compare_90d:
+            before = result[result['Dates'] <= past].groupby('Instrument', sort = False)['Value'].last()
+            sliced[metric.name + '_90past'] = before.combine_first(by_instrument.first()).reset_index()
+    return sliced
+
+
+
+
+
+#####################################################################################
+######################### Sector Frame Assembly ##############################
+#####################################################################################
+
+def assemble_sector_frame(universe, metric_data, registry=REGISTRY):
+    # Row position of every instrument code, one lookup per universe column
+    lookups = {column: pd.Index(universe[column]) for column in UNIVERSE_COLUMNS}
+
+    # Every fetched column with the universe its instruments come from
+    columns = []
+    for metric in fetched_metrics(registry):
+        columns.append((metric.name, metric.universe))
+        if metric.compare_90d:
+            columns.append((metric.name + '_90past', metric.universe))
+
+    # Scatter each result into one preallocated (sector x metric) matrix
+    values = np.full((len(universe), len(columns)), np.nan)
+    for j, (name, universe_column) in enumerate(columns):
+        result = metric_data.get(name)
+        if result is None or not len(result):
+            continue
+        rows = lookups[universe_column].get_indexer(result['Instrument'])
+        found = rows >= 0
+        values[rows[found], j] = result['Value'].to_numpy(dtype = float)[found]
+
+    df = pd.DataFrame(values, index = pd.Index(universe['sector'], name = 'sector'),
+                      columns = [name for name, _ in columns])
+
+    # Metrics derived locally as the mean of other metrics
+    for metric in derived_metrics(registry):
+        df[metric.name] = df[list(metric.inputs)].mean(axis=1)
+
+    # Improved vs 90 days ago, for every trend metric in one comparison
+    trend = [metric.name for metric in fetched_metrics(registry) if metric.compare_90d]
+    improved = pd.DataFrame(df[trend].to_numpy() > df[[name + '_90past' for name in trend]].to_numpy(),
+                            index = df.index, columns = trend)
+    return df, improved
+
+
+
+
+
+#####################################################################################
+######################### Snapshot Build ##############################
+#####################################################################################
+
+def local_zscores(df, engine, registry=REGISTRY):
+    # 20-year z-scores from the local engine, shaped like fetched (Instrument, Value) results
+    tickers = universe_tickers(df)
+
+    results = {}
+    for universe_column in UNIVERSE_COLUMNS:
+        metrics = [metric for metric in zscore_metrics(registry) if metric.universe == universe_column]
+        if not metrics:
+            continue
+        scores = engine.update(tickers[universe_column], list(dict.fromkeys(metric.zscore for metric in metrics)))
+        for metric in metrics:
+            score = scores[metric.zscore]
+            results[metric.name] = pd.DataFrame({'Instrument': score.index, 'Value': score.to_numpy()})
+    return results
+
+
+
+
+def local_metrics(registry=REGISTRY, skip=()):
+    # Fetched metrics whose DS expression the local evaluator supports
+    return [metric for metric in fetched_metrics(registry) if metric.name not in skip and is_local(metric.field)]
+
+
+
+
+def base_series(df, fetch_series, metrics, extra=None, first=None):
+    # Raw series every metric reads, fetched once with as much history before first (default today)
+    # as its deepest expression needs. extra adds {(tickers, field): years} series wanted for other local calculations.
+    tickers = universe_tickers(df)
+
+    # Years of history every base series needs, X leaves reading the metric's universe
+    needed = dict(extra or {})
+    for metric in metrics:
+        node = parse(metric.field)
+        years = math.ceil((lookback(node) + (90 if metric.compare_90d else 0) + 14) / 365)
+        for ticker, field in leaves(node):
+            key = (ticker or tickers[metric.universe], field)
+            needed[key] = max(needed.get(key, 0), years)
+
+    # One fetch per (tickers, history length), each field fetched once however many metrics read it
+    requests = {}
+    for (series_tickers, field), years in needed.items():
+        requests.setdefault((series_tickers, years), []).append(field)
+
+    first = pd.Timestamp(first) if first is not None else pd.Timestamp.today().normalize()
+    series = {}
+    for (series_tickers, years), fields in requests.items():
+        series_start = (first - pd.DateOffset(years = years)).strftime('%Y-%m-%d')
+        for field, frame in fetch_series(series_tickers, fields, series_start, end).items():
+            series[(series_tickers, field)] = frame
+    return series
+
+
+
+
+def local_expressions(df, series, metrics, as_of=None, regressions=None, histories=None):
+    # Values on as_of (default today) and 90 days before of every metric, evaluated from the base series.
+    # With regressions (a RollingRegressions kept across builds) a rolling REGB#/CORR# metric is taken from
+    # its engine, updated with only the days since its last build, and its full history by sector goes into
+    # histories[metric name] when histories is a dict.
+    tickers = universe_tickers(df)
+    as_of = pd.Timestamp(as_of) if as_of is not None else pd.Timestamp.today().normalize()
+
+    evaluator = Evaluator(series)
+    results = {}
+    for metric in metrics:
+        dates = [(metric.name, as_of)]
+        if metric.compare_90d:
+            dates.append((metric.name + '_90past', as_of - pd.Timedelta(days = 90)))
+        for name, date in dates:
+            regression = None
+            if regressions is not None and date == as_of:
+                regression = evaluator.regression(metric.field, tickers[metric.universe], date, metric.freq)
+            if regression is None:
+                value = evaluator.evaluate(metric.field, tickers[metric.universe], date, metric.freq)
+            else:
+                kind, window, x, y = regression
+                beta, corr = regressions.extend((metric.field, tickers[metric.universe], metric.freq), window, x, y)
+                history = beta if kind == 'beta' else corr
+                value = history.iloc[-1]
+                if histories is not None:
+                    histories[metric.name] = history.rename(columns = df.set_index(metric.universe)['sector'])
+            results[name] = pd.DataFrame({'Instrument': value.index, 'Value': value.to_numpy()})
+    return results
+
+
+
+
+# Trading days in the sector correlation matrix window, and years of daily prices fetched for it
+CORRELATION_WINDOW = 200
+CORRELATION_YEARS = 1
+
+
+def sector_correlations(df, prices, window=CORRELATION_WINDOW, as_of=None, engine=None):
+    # (sector x sector) correlation of daily log returns over the window ending on as_of (default latest).
+    # engine is a RollingCorrelationMatrix kept across builds, updated with only the days since its last one.
+    if prices is None or prices.empty:
+        return None
+    prices = prices.sort_index()
+    if as_of is not None:
+        prices = prices[prices.index <= pd.Timestamp(as_of)]
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        returns = np.log(prices / prices.shift(1)).iloc[1:].reindex(columns = df['sector_ticker'])
+    matrix = engine.extend(returns) if engine is not None else RollingCorrelationMatrix(window).fit(returns)
+    sectors = df['sector'].to_list()
+    matrix.index, matrix.columns = sectors, sectors
+    return matrix
+
+
+
+
+@contextmanager
+def stage(timings, name):
+    # Add the seconds spent inside the block to timings[name], when timings is a dict
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + time.perf_counter() - started
+
+
+
+
+def build_snapshot(fetch, registry=REGISTRY, zscores=None, fetch_series=None, universe=None, timings=None, progress=None,
+                   correlation_engine=None, regressions=None):
+    # Fetch every metric with fetch(requests) -> {name: frame} and assemble the sector frame.
+    # With a ZScoreEngine the 20-year z-scores are computed locally instead of server-side, and with
+    # fetch_series(tickers, fields, start, end) every supported expression is evaluated from raw series,
+    # the sector correlations updating correlation_engine (a RollingCorrelationMatrix) and the rolling
+    # betas and correlations updating regressions (a RollingRegressions) when they are given.
+    # universe defaults to the 11 sectors; timings collects the seconds spent in each stage.
+    # progress(frame, improved) is called with the partly assembled frame: empty first, then as server-side
+    # results land (fetch is called as fetch(requests, on_result) and passes each partial result to on_result)
+    # and once the z-scores are in, before the slower local expressions.
+    universe = sector_universe() if universe is None else universe
+    skip = {metric.name for metric in zscore_metrics(registry)} if zscores is not None else set()
+    metrics = local_metrics(registry, skip = skip) if fetch_series is not None else []
+    skip |= {metric.name for metric in metrics}
+
+    fetched, local = {}, {}
+    def landed(partial=None):
+        if partial:
+            merge_results(fetched, partial)
+        metric_data = slice_endpoints(fetched, registry)
+        metric_data.update(local)
+        progress(*assemble_sector_frame(universe, metric_data, registry))
+
+    # Server-side metrics first, they are the quickest to arrive
+    if progress is not None:
+        landed()
+    with stage(timings, 'fetch'):
+        plan = make_fetch_plan(universe, registry, skip = skip)
+        fetched = fetch(plan, landed) if progress is not None else fetch(plan)
+
+    if zscores is not None:
+        with stage(timings, 'zscores'):
+            local.update(local_zscores(universe, zscores, registry))
+        if progress is not None:
+            landed()
+
+    correlations, histories = None, {}
+    if fetch_series is not None:
+        sector_prices = (universe_tickers(universe)['sector_ticker'], 'X')
+        with stage(timings, 'series'):
+            series = base_series(universe, fetch_series, metrics, extra = {sector_prices: CORRELATION_YEARS})
+        with stage(timings, 'expressions'):
+            local.update(local_expressions(universe, series, metrics, regressions = regressions, histories = histories))
+        with stage(timings, 'correlations'):
+            correlations = sector_correlations(universe, series.get(sector_prices), engine = correlation_engine)
+
+    metric_data = slice_endpoints(fetched, registry)
+    metric_data.update(local)
+    with stage(timings, 'assemble'):
+        frame, improved = assemble_sector_frame(universe, metric_data, registry)
+    return Snapshot(frame, improved, metric_data, correlations, histories or None)
+
+
+
+
+
+def backfill_snapshots(fetch, dates, registry=REGISTRY, fetch_series=None):
+    # Snapshots for past as-of dates, every metric fetched once as a range covering all of them.
+    # The z-score engine only tracks today, so with fetch_series the z-scores are evaluated from 20-year series.
+    dates = sorted(pd.Timestamp(date).normalize() for date in dates)
+    universe = sector_universe()
+
+    metrics, series, sector_prices = [], {}, (universe_tickers(universe)['sector_ticker'], 'X')
+    if fetch_series is not None:
+        metrics = local_metrics(registry)
+        series = base_series(universe, fetch_series, metrics, extra = {sector_prices: CORRELATION_YEARS}, first = dates[0])
+
+    fetched = fetch(make_fetch_plan(universe, registry, skip = {metric.name for metric in metrics}, dates = dates))
+
+    snapshots = {}
+    for as_of in dates:
+        metric_data = slice_endpoints(fetched, registry, as_of)
+        metric_data.update(local_expressions(universe, series, metrics, as_of))
+        frame, improved = assemble_sector_frame(universe, metric_data, registry)
+        correlations = sector_correlations(universe, series.get(sector_prices), as_of = as_of)
+        snapshots[as_of.strftime('%Y-%m-%d')] = Snapshot(frame, improved, metric_data, correlations)
+    return snapshots
@@ -0,0 +1,204 @@
+###########################################
+########## Package Imports
+###########################################
+import hashlib, json, threading
+from collections import OrderedDict
+import pandas as pd, numpy as np
+from metrics import display_rows
+
+
+
+
+
+########################################################################################################
+#################################### POST PROCESSING ###################################################
+########################################################################################################
+
+def display_frame(frame):
+    # Shown metrics in display order, as (group, label) rows by sector columns
+    rows = display_rows()
+    df = frame[[column for column, group, label, trend in rows]]
+
+    # Rename Index
+    df.index.name = None
+
+    # Rename Columns
+    df.columns = pd.MultiIndex.from_tuples([(group, label) for column, group, label, trend in rows])
+    return df.T
+
+
+
+
+
+######################################################################################
+################### Format Output
+######################################################################################
+
+# Table style configuration; part of every cached table's key, so changing it re-renders them
+CAPTION = "Global Equity Sector Dashboard [Source: Refinitiv DataStream, Acorn MC Ltd]"
+BORDER = '1px solid black'
+HEADER_COLOR = '#CCCEE7'
+PRECISION = 1
+STYLE_CONFIG = dict(caption = CAPTION, border = BORDER, header_color = HEADER_COLOR, precision = PRECISION)
+
+
+def group_runs(rows):
+    # (group, first label, last label) of every run of consecutive display rows sharing a group
+    runs = []
+    for column, group, label, trend in rows:
+        if runs and runs[-1][0] == group:
+            runs[-1][2] = label
+        else:
+            runs.append([group, label, label])
+    return [tuple(run) for run in runs]
+
+
+
+
+def make_pretty(styler):
+    # Set Decimal Precision
+    styler.format(precision=PRECISION)
+
+
+    # Create Title
+    caption_styles = [dict(selector="caption",
+            props=[("text-align", "centre"),
+                   ("font-size", "120%"),
+                   ("color", 'black'),
+                  ('caption-side', 'top')])]
+
+    styler.set_caption(CAPTION).set_table_styles(caption_styles, overwrite=False)
+
+
+    # Create border for entire table
+    styler.set_table_styles([{'selector' : '',
+                            'props' : [('border', BORDER)]}], overwrite=False)
+
+    # Background color for all rows
+    styler.set_table_styles([{'selector': 'td',
+                              'props': [('background-color', 'white')]}], overwrite=False)
+
+    # Set border color between columns
+    styler.set_table_styles([
+        {'selector': 'td', 'props': f'border-left: {BORDER}'},
+        {'selector': 'td', 'props': f'border-right: {BORDER}'}
+    ]
+    , overwrite=False, axis=0)
+
+    # Background color for column headers and row index
+    styler.set_table_styles([
+        {'selector': 'th:not(.index_name)', 'props': f'background-color: {HEADER_COLOR}; color: black;'}
+    ], overwrite=False)
+
+
+    # Set border color between headers: both sides of every other sector, which rules off every column
+    styler.set_table_styles({column: [
+        {'selector': 'th', 'props': f'border-left: {BORDER}'},
+        {'selector': 'th', 'props': f'border-right: {BORDER}'},
+    ] for column in styler.columns[::2]}, overwrite=False, axis=0)
+
+
+    # Rule off the metric groups of the registry: borders around every other group, a line under the
+    # last metric of each group and above the first row
+    runs = group_runs(display_rows())
+    framed = [group for group, first, last in runs[1::2]]
+    lasts = [last for group, first, last in runs]
+
+    def index_level0(s):
+        return np.where(s.isin(framed),
+                        f"border-bottom: {BORDER}; border-top: {BORDER};", "")
+
+    styler.apply_index(index_level0)
+
+
+    def index_level1_bottom(s):
+        return np.where(s.isin(lasts),
+                        f"border-bottom: {BORDER};", "")
+    styler.apply_index(index_level1_bottom)
+
+
+    def index_level1_top(s):
+        return np.where(s.isin([runs[0][1]]),
+                        f"border-top: {BORDER};", "")
+    styler.apply_index(index_level1_top)
+
+
+    return styler
+
+
+
+# Arrow Color code
+UP = '<span style="color:green;">&#x25B2;</span>'
+DOWN = '<span style="color:red;">&#x25BC;</span>'
+
+
+def add_trend_arrows(styler, improved, sparklines={}, na_rep='nan'):
+    # Append the UP/DOWN arrow, and the sparkline where there is one, to trend rows at render time, keeping the data numeric.
+    # Missing values show na_rep without an arrow.
+    for column, group, label, trend in display_rows():
+        if not trend:
+            continue
+        for arrow, sectors in ((UP, improved.index[improved[column]]), (DOWN, improved.index[~improved[column]])):
+            if column not in sparklines:
+                styler.format(lambda v, arrow=arrow: f"{v:.{PRECISION}f}{arrow}" if pd.notna(v) else na_rep,
+                              subset = pd.IndexSlice[[(group, label)], list(sectors)])
+                continue
+            for sector in sectors:
+                suffix = arrow + sparklines[column].get(sector, '')
+                styler.format(lambda v, suffix=suffix: f"{v:.{PRECISION}f}{suffix}" if pd.notna(v) else na_rep,
+                              subset = pd.IndexSlice[[(group, label)], [sector]])
+    return styler
+
+
+
+
+def pending_table(frame, improved):
+    # Partly built sector frame for progressive rendering, metrics still loading shown as '…'
+    return (display_frame(frame).style.pipe(make_pretty)
+                                .format(precision = PRECISION, na_rep = '…')
+                                .pipe(add_trend_arrows, improved, na_rep = '…'))
+
+
+
+
+
+######################################################################################
+################### Rendered Table Cache
+######################################################################################
+
+def table_key(frame, improved, sparklines):
+    # Content hash of everything the rendered table depends on: values, trends, sparklines, rows and style
+    digest = hashlib.sha1()
+    for data in (frame, improved):
+        digest.update(pd.util.hash_pandas_object(data, index = True).to_numpy().tobytes())
+        digest.update(json.dumps([str(column) for column in data.columns]).encode())
+    digest.update(json.dumps(sparklines, sort_keys = True).encode())
+    digest.update(json.dumps([STYLE_CONFIG, display_rows()]).encode())
+    return digest.hexdigest()
+
+
+
+
+# Process-wide LRU of rendered table HTML by content hash, so an unchanged snapshot
+# is served as a stored string instead of being styled and rendered again
+class TableCache:
+
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+
+    def html(self, frame, improved, sparklines={}):
+        key = table_key(frame, improved, sparklines)
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+
+        html = display_frame(frame).style.pipe(make_pretty).pipe(add_trend_arrows, improved, sparklines).to_html()
+        with self.lock:
+            self.entries[key] = html
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last = False)
+        return html
@@ -0,0 +1,169 @@
+###########################################
+########## Package Imports
+###########################################
+import asyncio, logging, threading
+from datetime import datetime as dt, timedelta, timezone
+import aiohttp
+from DatastreamDSWS import Datastream
+from DatastreamDSWS.DS_Requests import DataRequest, TokenRequest, Properties
+from ds_fetch import fetch_metrics_async
+from ds_client import token_expiry
+
+
+log = logging.getLogger('ds_async')
+
+
+
+
+
+##############################################
+######## Async DSWS Client
+##############################################
+
+# DSWS REST endpoint used by DatastreamDSWS.Datastream
+DSWS_URL = "https://product.datastream.com/DSWSClient/V1/DSService.svc/rest/"
+
+
+# asyncio client speaking the same DSWS JSON protocol as DatastreamDSWS.Datastream
+class AsyncDatastream:
+
+    # Reuse the request builder and response decoders of the synchronous client
+    appID = Datastream.appID
+    post_user_request = Datastream.post_user_request
+    _format_Response = Datastream._format_Response
+    _format_bundle_response = Datastream._format_bundle_response
+    _get_DatatypeValues = Datastream._get_DatatypeValues
+    _get_Date = Datastream._get_Date
+
+
+    # Tokens of this process by (url, username), shared by every client so each run doesn't log in again:
+    # reused until refresh_margin before their expiry, a failed login tried again 30 seconds later
+    tokens = {}
+    tokens_lock = threading.Lock()
+
+
+    def __init__(self, username, password, url=DSWS_URL, max_concurrency=4, timeout=180, dataSource=None,
+                 refresh_margin=timedelta(minutes = 15)):
+        self.username = username
+        self.password = password
+        self.url = url
+        self.dataSource = dataSource
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.refresh_margin = refresh_margin
+        self.session = None
+        self.semaphore = None
+        self.login_lock = None
+
+
+    async def __aenter__(self):
+        try:
+            await self.open()
+        except BaseException:
+            await self.close()
+            raise
+        return self
+
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+    async def open(self):
+        # One keep-alive session per client, shared by every request; the login waits for the first request
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.login_lock = asyncio.Lock()
+        self.session = aiohttp.ClientSession(
+            connector = aiohttp.TCPConnector(limit = self.max_concurrency, keepalive_timeout = 60),
+            timeout = aiohttp.ClientTimeout(total = self.timeout))
+
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+
+    async def _post(self, method, raw_request):
+        # POST a raw request dictionary, bounded by the client semaphore; None on any failure, like the DSWS client
+        try:
+            async with self.semaphore:
+                async with self.session.post(self.url + method, json = raw_request) as http_response:
+                    if http_response.status != 200:
+                        log.warning("DSWS %s returned HTTP %s", method, http_response.status)
+                        return None
+                    return dict(await http_response.json(content_type = None))
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as error:
+            log.warning("DSWS %s failed: %r", method, error)
+            return None
+
+
+    async def _get_token(self):
+        propties = [Properties("__AppId", self.appID)]
+        if self.dataSource:
+            propties.append(Properties("Source", self.dataSource))
+        raw_tokenReq = TokenRequest(self.username, self.password, propties).get_TokenRequest()
+        return await self._post("GetToken", raw_tokenReq)
+
+
+    async def _token_value(self):
+        # Token value of the process-wide token, logging in first when there is none or it is about to expire
+        key = (self.url, self.username)
+        async with self.login_lock:
+            with self.tokens_lock:
+                token, expiry = self.tokens.get(key, (None, None))
+            now = dt.now(timezone.utc)
+            if expiry is None or now >= expiry - self.refresh_margin:
+                token = await self._get_token()
+                expiry = token_expiry(token) or now + self.refresh_margin + timedelta(seconds = 30)
+                with self.tokens_lock:
+                    self.tokens[key] = (token, expiry)
+
+        if token is None or 'TokenValue' not in token:
+            log.warning("DSWS login failed: %s", (token or {}).get('Message', 'no response'))
+            return None
+        return token['TokenValue']
+
+
+    async def get_data(self, tickers, fields=None, start='', end='', freq='', kind=1):
+        token = await self._token_value()
+        if token is None:
+            return None
+        req, retName = self.post_user_request(tickers, fields or [], start, end, freq, kind)
+        raw_dataRequest = DataRequest().get_Request(req, self.dataSource, token)
+
+        json_Response = await self._post("GetData", raw_dataRequest)
+        if json_Response is None or 'DataResponse' not in json_Response:
+            return None
+        return self._format_Response(json_Response['DataResponse'])
+
+
+    async def get_bundle_data(self, bundleRequest=None, retName=False):
+        token = await self._token_value()
+        if token is None:
+            return None
+        raw_dataRequest = DataRequest().get_bundle_Request(bundleRequest or [], self.dataSource, token)
+
+        json_Response = await self._post("GetDataBundle", raw_dataRequest)
+        if json_Response is None or 'DataResponses' not in json_Response:
+            return None
+        return self._format_bundle_response(json_Response)
+
+
+
+
+
+##############################################
+######## Fetch Entry Point
+##############################################
+
+def run_fetch(username, password, metric_requests, mode='grouped', max_concurrency=4, url=DSWS_URL, retries=0, stats=None,
+              on_result=None):
+    # Fetch every planned request as a coroutine over one session, closed however the run ends.
+    # The login token is kept for the process, so only the first run (or one after expiry) logs in.
+    async def main():
+        async with AsyncDatastream(username, password, url = url, max_concurrency = max_concurrency) as client:
+            return await fetch_metrics_async(client, metric_requests, mode = mode, retries = retries, stats = stats,
+                                             on_result = on_result)
+
+    return asyncio.run(main())
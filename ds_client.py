@@ -0,0 +1,83 @@
+###########################################
+########## Package Imports
+###########################################
+import re, threading
+from datetime import datetime as dt, timedelta, timezone
+import requests
+from requests.adapters import HTTPAdapter
+import DatastreamDSWS as DSWS
+
+
+
+
+
+##############################################
+######## Pooled Datastream Client
+##############################################
+
+# Path the DSWS client appends GetToken / GetData / GetDataBundle to
+DSWS_PATH = '/DSWSClient/V1/DSService.svc/rest/'
+
+
+def token_expiry(token):
+    # UTC expiry of a GetToken response, None when it has none
+    match = re.match(r"^/Date\((-?\d+)", (token or {}).get('TokenExpiry') or '')
+    return dt.fromtimestamp(int(match.group(1)) / 1000, tz = timezone.utc) if match else None
+
+
+
+
+# DatastreamDSWS client meant to be created once per process and shared by every session and thread.
+# Nothing is sent until the first request; the token is then reused until refresh_margin before its
+# expiry and fetched again by whichever request gets there first. Every call goes through one pooled
+# keep-alive HTTP session instead of a new connection (and TLS handshake) per request.
+class PooledDatastream(DSWS.Datastream):
+
+    def __init__(self, username, password, url=None, dataSource=None, refresh_margin=timedelta(minutes = 15),
+                 pool_size=8, timeout=180):
+        # DSWS.Datastream.__init__ logs in straight away, so set its attributes without calling it
+        self.url = url or DSWS.Datastream.url + DSWS_PATH
+        self.username = username
+        self.password = password
+        self.dataSource = dataSource
+        self._timeout = timeout
+        self.certfile = requests.certs.where()
+        self.refresh_margin = refresh_margin
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections = 1, pool_maxsize = pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.token_lock = threading.Lock()
+        self.token = None
+        self.expiry = None
+
+
+    @property
+    def tokenResp(self):
+        # Current token, logging in first when there is none or it is about to expire
+        with self.token_lock:
+            now = dt.now(timezone.utc)
+            if self.expiry is None or now >= self.expiry - self.refresh_margin:
+                self.token = self._get_token()
+                # A failed login is tried again 30 seconds later
+                self.expiry = token_expiry(self.token) or now + self.refresh_margin + timedelta(seconds = 30)
+            return self.token
+
+
+    @tokenResp.setter
+    def tokenResp(self, value):
+        with self.token_lock:
+            self.token = value
+            self.expiry = token_expiry(value)
+
+
+    def _get_Response(self, reqUrl, raw_request):
+        # Same request as the DSWS client, sent through the pooled session
+        return self.session.post(reqUrl, json = self._json_Request(raw_request), proxies = self._proxy,
+                                 verify = self._sslCer or self.certfile, timeout = self._timeout)
+
+
+    def close(self):
+        self.session.close()
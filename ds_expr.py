@@ -0,0 +1,406 @@
+###########################################
+########## Package Imports
+###########################################
+import math, re
+from functools import lru_cache
+import numpy as np, pandas as pd
+from rolling import beta_corr, window_moments, window_sum
+
+
+
+
+
+##############################################
+######## Expression Parser
+##############################################
+
+# Argument kinds of every function the local evaluator implements:
+#   x expression, p period (200D, 1M, -20Y), w keyword (GT, MTE), e empty
+SIGNATURES = {
+    'PCH': 'xp', 'ACH': 'xp', 'LAG': 'xp', 'MAV': 'xp',
+    'LN': 'x', 'PAD': 'x', 'REB': 'x', 'REBE': 'xw',
+    'CORR': 'xxp', 'REGB': 'xxp',
+    'IF': 'xwx',
+    'AVG': 'xpe', 'SDN': 'xpe',
+}
+
+# Functions whose value on a date depends on the range requested, REB#/REBE# rebasing at its first/last date
+RANGE_FUNCTIONS = {'REB', 'REBE'}
+
+# Rolling regressions a RollingRegression engine can keep up to date, and the history each one reads
+REGRESSION_FUNCTIONS = {'REGB': 'beta', 'CORR': 'corr'}
+
+# Calendar days per period unit, D counting trading days
+PERIOD_DAYS = {'D': 7 / 5, 'W': 7, 'M': 31, 'Q': 92, 'Y': 366}
+
+TOKEN = re.compile(r"\s*(?:(\d+(?:\.\d+)?)([DWMQY])\b|(\d+(?:\.\d+)?)|([A-Za-z_][A-Za-z0-9_]*)(#?)|(\S))")
+
+
+class UnsupportedExpression(ValueError):
+    pass
+
+
+def tokenize(expression):
+    tokens = []
+    pos = 0
+    while pos < len(expression.rstrip()):
+        match = TOKEN.match(expression, pos)
+        period, unit, number, name, function, symbol = match.groups()
+        if period:
+            tokens.append(('period', float(period), unit))
+        elif number:
+            tokens.append(('num', float(number)))
+        elif name:
+            tokens.append(('function' if function else 'name', name.upper()))
+        else:
+            tokens.append(('sym', symbol))
+        pos = match.end()
+    return tokens
+
+
+@lru_cache(maxsize = None)
+def parse(expression):
+    # DS expression -> nested tuples, hashable so equal subexpressions share one evaluation:
+    #   ('num', v), ('period', n, unit), ('leaf', ticker, field), ('word', name), ('empty',),
+    #   ('neg', a), ('op', symbol, a, b), ('call', function, args)
+    # ticker is None for the metric's own instruments (X, X(PE), E062(X)), otherwise a constant series (TOTMKWD)
+    tokens = tokenize(expression)
+    pos = 0
+
+    def peek():
+        return tokens[pos] if pos < len(tokens) else ('end',)
+
+    def take(*expected):
+        nonlocal pos
+        token = peek()
+        if expected and token[-1] not in expected:
+            raise UnsupportedExpression(f"unexpected {token[-1]!r} in {expression!r}")
+        pos += 1
+        return token
+
+    def expr():
+        node = term()
+        while peek() in (('sym', '+'), ('sym', '-')):
+            node = ('op', take()[1], node, term())
+        return node
+
+    def term():
+        node = unary()
+        while peek() in (('sym', '*'), ('sym', '/')):
+            node = ('op', take()[1], node, unary())
+        return node
+
+    def unary():
+        if peek() == ('sym', '-'):
+            take()
+            node = unary()
+            return ('period', -node[1], node[2]) if node[0] == 'period' else ('neg', node)
+        return atom()
+
+    def atom():
+        token = take()
+        if token == ('sym', '('):
+            node = expr()
+            take(')')
+            return node
+        if token[0] in ('num', 'period'):
+            return token
+        if token[0] == 'function':
+            return call(token[1])
+        if token[0] == 'name':
+            return leaf(token[1])
+        raise UnsupportedExpression(f"unexpected {token[-1]!r} in {expression!r}")
+
+    def leaf(name):
+        if peek() != ('sym', '('):
+            if name == 'ZERO':
+                return ('num', 0.0)
+            return ('leaf', None, 'X') if name == 'X' else ('leaf', name, 'X')
+        take('(')
+        inner = take()[1]
+        take(')')
+        if name == 'X':
+            return ('leaf', None, f"X({inner})")
+        if inner == 'X':
+            # Stored expression applied to the instrument, e.g. E062(X)
+            return ('leaf', None, f"{name}(X)")
+        return ('leaf', name, f"X({inner})")
+
+    def call(name):
+        take('(')
+        signature = SIGNATURES.get(name, '')
+        args = []
+        while True:
+            if peek() in (('sym', ','), ('sym', ')')):
+                args.append(('empty',))
+            elif signature[len(args):len(args) + 1] == 'w' and peek()[0] == 'name':
+                args.append(('word', take()[1]))
+            else:
+                args.append(expr())
+            if take(',', ')')[1] == ')':
+                return ('call', name, tuple(args))
+
+    node = expr()
+    if pos != len(tokens):
+        raise UnsupportedExpression(f"trailing {peek()[-1]!r} in {expression!r}")
+    return node
+
+
+
+
+def children(node):
+    if node[0] == 'neg':
+        return [node[1]]
+    if node[0] == 'op':
+        return [node[2], node[3]]
+    if node[0] == 'call':
+        return [arg for arg in node[2] if arg[0] not in ('period', 'word', 'empty')]
+    return []
+
+
+def leaves(node):
+    # Every (ticker, field) base series an expression reads
+    if node[0] == 'leaf':
+        return {node[1:]}
+    return set().union(*(leaves(child) for child in children(node)))
+
+
+def lookback(node):
+    # Calendar days of history an expression reads before its evaluation date
+    inner = max((lookback(child) for child in children(node)), default = 0)
+    if node[0] == 'call':
+        inner += sum(abs(arg[1]) * PERIOD_DAYS[arg[2]] for arg in node[2] if arg[0] == 'period')
+    return math.ceil(inner)
+
+
+def range_dependent(expression):
+    # True when the expression's value on a date changes with the requested range, so it can't be sliced from one
+    try:
+        node = parse(expression)
+    except UnsupportedExpression:
+        return bool(re.search(r"\bREBE?#", expression, re.IGNORECASE))
+
+    def rebased(node):
+        return (node[0] == 'call' and node[1] in RANGE_FUNCTIONS) or any(rebased(child) for child in children(node))
+
+    return rebased(node)
+
+
+
+
+def is_local(expression):
+    # True when every function in the expression is implemented here with the arguments it is given
+    try:
+        node = parse(expression)
+    except UnsupportedExpression:
+        return False
+
+    def supported(node):
+        if node[0] == 'call':
+            signature = SIGNATURES.get(node[1])
+            if signature is None or len(signature) != len(node[2]):
+                return False
+            for kind, arg in zip(signature, node[2]):
+                given = arg[0] if arg[0] in ('period', 'word', 'empty') else 'expression'
+                if given != {'x': 'expression', 'p': 'period', 'w': 'word', 'e': 'empty'}[kind]:
+                    return False
+        return all(supported(child) for child in children(node))
+
+    return supported(node)
+
+
+
+
+
+##############################################
+######## Vectorized Functions
+##############################################
+
+# Every function works on (dates x instruments) arrays; a single column broadcasts across instruments
+
+def period_offset(n, unit):
+    return pd.DateOffset(**{'W': {'weeks': n}, 'M': {'months': n}, 'Q': {'months': 3 * n}, 'Y': {'years': n}}[unit])
+
+
+def offset_rows(dates, period):
+    # Row of the last observation at or before t - period for every row t, negative when history doesn't reach
+    n, unit = int(abs(period[1])), period[2]
+    if unit == 'D':
+        return np.arange(len(dates)) - n
+    return dates.searchsorted(dates - period_offset(n, unit), side = 'right') - 1
+
+
+def lag(a, dates, period):
+    rows = offset_rows(dates, period)
+    out = a[np.clip(rows, 0, None)]
+    out[rows < 0] = np.nan
+    return out
+
+
+def window_length(period):
+    # Trailing window of a period as RollingRegression takes it: trading days as rows, longer units as an offset
+    n, unit = int(abs(period[1])), period[2]
+    return n if unit == 'D' else period_offset(n, unit)
+
+
+def window_start(dates, period):
+    # First row inside (t - period, t] for every row t
+    return np.clip(offset_rows(dates, period) + 1, 0, None)
+
+
+def moving_average(a, dates, period):
+    start = window_start(dates, period)
+    n = window_sum((~np.isnan(a)).astype(float), start)
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        return np.where(n > 0, window_sum(a, start) / n, np.nan)
+
+
+def window_std(a, dates, period):
+    n, saa, _, _ = window_moments(a, a, window_start(dates, period))
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        return np.where(n > 1, np.sqrt(np.clip(saa, 0, None) / (n - 1)), np.nan)
+
+
+def correlation(a, b, dates, period):
+    return beta_corr(*window_moments(a, b, window_start(dates, period)))[1]
+
+
+def regression_beta(a, b, dates, period):
+    # Slope of b regressed on a, REGB#(market, instrument, period) being the instrument's beta
+    return beta_corr(*window_moments(a, b, window_start(dates, period)))[0]
+
+
+def rebase(a, last=False):
+    # 100 at the first (REB#) or last (REBE#) valid observation of each column
+    valid = ~np.isnan(a)
+    rows = len(a) - 1 - valid[::-1].argmax(axis = 0) if last else valid.argmax(axis = 0)
+    base = np.where(valid.any(axis = 0), a[rows, np.arange(a.shape[1])], np.nan)
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        return 100.0 * a / base
+
+
+COMPARISONS = {'GT': np.greater, 'LT': np.less, 'GE': np.greater_equal, 'LE': np.less_equal,
+               'EQ': np.equal, 'NE': np.not_equal}
+
+
+def compare(a, word, b):
+    if word not in COMPARISONS:
+        raise UnsupportedExpression(f"IF# comparison {word}")
+    with np.errstate(invalid = 'ignore'):
+        return np.where(np.isnan(a) | np.isnan(b), np.nan, COMPARISONS[word](a, b).astype(float))
+
+
+FUNCTIONS = {
+    'PCH': lambda dates, a, p: 100.0 * (a / lag(a, dates, p) - 1.0),
+    'ACH': lambda dates, a, p: a - lag(a, dates, p),
+    'LAG': lambda dates, a, p: lag(a, dates, p),
+    'MAV': lambda dates, a, p: moving_average(a, dates, p),
+    'LN': lambda dates, a: np.log(a),
+    'PAD': lambda dates, a: pd.DataFrame(a).ffill().to_numpy(),
+    'REB': lambda dates, a: rebase(a),
+    'REBE': lambda dates, a, word: rebase(a, last = True),
+    'CORR': lambda dates, a, b, p: correlation(a, b, dates, p),
+    'REGB': lambda dates, a, b, p: regression_beta(a, b, dates, p),
+    'IF': lambda dates, a, word, b: compare(a, word[1], b),
+    'AVG': lambda dates, a, p, end: moving_average(a, dates, p),
+    'SDN': lambda dates, a, p, end: window_std(a, dates, p),
+}
+
+OPERATORS = {'+': np.add, '-': np.subtract, '*': np.multiply, '/': np.divide}
+
+
+
+
+
+##############################################
+######## Expression Evaluator
+##############################################
+
+# Evaluates DS expressions over locally held base series. Results are memoised per
+# (subexpression, instruments, as-of date, frequency), so a base series or a shared
+# subexpression such as LN#(TOTMKWD/LAG#(TOTMKWD,1M)) is computed once per build.
+class Evaluator:
+
+    def __init__(self, series):
+        # series: {(tickers, field): (dates x instruments) frame}, tickers being the
+        # comma-separated universe for X leaves or the constant ticker itself
+        self.series = series
+        self.start = min((frame.index.min() for frame in series.values() if len(frame)), default = pd.Timestamp.today())
+        self.memo = {}
+        self.calendars = {}
+
+
+    def dates(self, as_of, freq):
+        # Daily rows are business days; monthly rows step back whole months from as_of, as DS does
+        if (as_of, freq) not in self.calendars:
+            if freq == 'M':
+                months = (as_of.year - self.start.year) * 12 + as_of.month - self.start.month + 1
+                dates = pd.DatetimeIndex([as_of - pd.DateOffset(months = k) for k in range(max(months, 1) - 1, -1, -1)])
+            else:
+                days = pd.date_range(min(self.start, as_of), as_of, freq = 'D')
+                dates = days[days.dayofweek < 5]
+            self.calendars[(as_of, freq)] = dates
+        return self.calendars[(as_of, freq)]
+
+
+    def evaluate(self, expression, tickers, as_of, freq='D'):
+        # Value of expression on as_of for every instrument in tickers
+        instruments = tickers.split(',')
+        values = self.node(parse(expression), tickers, pd.Timestamp(as_of), freq)
+        return pd.Series(np.broadcast_to(values[-1], (len(instruments),)).copy(), index = instruments)
+
+
+    def regression(self, expression, tickers, as_of, freq='D'):
+        # (beta or corr, window, x, y) inputs of an expression that is a rolling REGB#/CORR#, else None;
+        # x and y are (dates x instruments) frames of its two arguments, the single-column one broadcast
+        node = parse(expression)
+        if node[0] != 'call' or node[1] not in REGRESSION_FUNCTIONS:
+            return None
+        instruments = tickers.split(',')
+        as_of = pd.Timestamp(as_of)
+        dates = self.dates(as_of, freq)
+        a, b = (np.broadcast_to(self.node(arg, tickers, as_of, freq), (len(dates), len(instruments)))
+                for arg in node[2][:2])
+        return (REGRESSION_FUNCTIONS[node[1]], window_length(node[2][2]),
+                pd.DataFrame(a, index = dates, columns = instruments), pd.DataFrame(b, index = dates, columns = instruments))
+
+
+    def node(self, node, tickers, as_of, freq):
+        key = (node, tickers, as_of, freq)
+        if key not in self.memo:
+            self.memo[key] = self.compute(node, tickers, as_of, freq)
+        return self.memo[key]
+
+
+    def compute(self, node, tickers, as_of, freq):
+        dates = self.dates(as_of, freq)
+        kind = node[0]
+
+        if kind == 'num':
+            return np.full((len(dates), 1), node[1])
+
+        if kind == 'leaf':
+            ticker, field = node[1], node[2]
+            columns = tickers.split(',') if ticker is None else [ticker]
+            frame = self.series.get((ticker or tickers, field))
+            if frame is None or frame.empty:
+                return np.full((len(dates), len(columns)), np.nan)
+            # As-of alignment carries the last published value, like DS padding
+            return frame.reindex(columns = columns).sort_index().reindex(dates, method = 'ffill').to_numpy(dtype = float)
+
+        if kind == 'neg':
+            return -self.node(node[1], tickers, as_of, freq)
+
+        if kind == 'op':
+            a = self.node(node[2], tickers, as_of, freq)
+            b = self.node(node[3], tickers, as_of, freq)
+            with np.errstate(invalid = 'ignore', divide = 'ignore'):
+                return OPERATORS[node[1]](a, b)
+
+        if kind == 'call' and node[1] in FUNCTIONS:
+            args = [arg if arg[0] in ('period', 'word', 'empty') else self.node(arg, tickers, as_of, freq)
+                    for arg in node[2]]
+            with np.errstate(invalid = 'ignore', divide = 'ignore'):
+                return FUNCTIONS[node[1]](dates, *args)
+
+        raise UnsupportedExpression(f"cannot evaluate {node!r} locally")
@@ -0,0 +1,473 @@
+###########################################
+########## Package Imports
+###########################################
+import asyncio, threading, time
+from collections import namedtuple, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+import pandas as pd
+
+
+
+
+
+##############################################
+######## Request Limits
+##############################################
+
+# DSWS caps a single request at 100 items (instruments x datatypes)
+MAX_REQUEST_ITEMS = 100
+
+# DSWS caps a bundle at 20 requests and 500 items in total
+MAX_BUNDLE_REQUESTS = 20
+MAX_BUNDLE_ITEMS = 500
+
+# Supported fetch modes
+FETCH_MODES = ('single', 'grouped', 'bundle')
+
+
+
+# One metric expression to fetch for a ticker universe on a given date / frequency
+MetricRequest = namedtuple('MetricRequest', ['name', 'field', 'tickers', 'start', 'end', 'freq'])
+
+
+
+#####################################################################################
+######################### Fetch Planner ##############################
+#####################################################################################
+
+def plan_requests(metric_requests, max_fields=None):
+    # Group every metric sharing the same universe, dates and frequency
+    groups = {}
+    for request in metric_requests:
+        key = (request.tickers, request.start, request.end, request.freq)
+        groups.setdefault(key, []).append(request)
+
+    # Split each group into multi-field calls that respect the DSWS item limit;
+    # universes larger than the limit are split into ticker chunks first
+    calls = []
+    for (universe, start, end, freq), requests in groups.items():
+        fields = list(dict.fromkeys(request.field for request in requests))
+        for tickers in ticker_chunks(universe):
+            n_tickers = len(tickers.split(','))
+            fields_per_call = max(1, MAX_REQUEST_ITEMS // n_tickers)
+            if max_fields:
+                fields_per_call = min(fields_per_call, max_fields)
+
+            for i in range(0, len(fields), fields_per_call):
+                chunk = fields[i:i + fields_per_call]
+                calls.append(dict(tickers = tickers,
+                                  start = start,
+                                  end = end,
+                                  freq = freq,
+                                  fields = chunk,
+                                  names = {field: [request.name for request in requests if request.field == field]
+                                           for field in chunk}))
+    return calls
+
+
+
+
+def ticker_chunks(tickers):
+    # Comma-separated ticker lists of at most MAX_REQUEST_ITEMS instruments each
+    symbols = tickers.split(',')
+    return [','.join(symbols[i:i + MAX_REQUEST_ITEMS]) for i in range(0, len(symbols), MAX_REQUEST_ITEMS)]
+
+
+
+
+def merge_results(results, partial):
+    # Add one call's {name: frame} results, stacking the rows of a metric split over ticker chunks
+    for name, frame in partial.items():
+        results[name] = pd.concat([results[name], frame], ignore_index = True) if name in results else frame
+    return results
+
+
+
+
+def call_items(call):
+    # Number of DSWS items (instruments x datatypes) a planned call costs
+    return len(call['tickers'].split(',')) * len(call['fields'])
+
+
+
+
+def plan_bundles(calls):
+    # Pack planned calls first-fit into as few bundles as the DSWS limits allow
+    bundles = []
+    for call in calls:
+        for bundle in bundles:
+            if (len(bundle) < MAX_BUNDLE_REQUESTS
+                    and sum(call_items(c) for c in bundle) + call_items(call) <= MAX_BUNDLE_ITEMS):
+                bundle.append(call)
+                break
+        else:
+            bundles.append([call])
+    return bundles
+
+
+
+
+def split_response(call, response):
+    # Map the long-format (Instrument, Datatype, Value) response back to one frame per metric
+    results = {}
+    empty = pd.DataFrame(columns = ['Instrument', 'Value'])
+
+    if isinstance(response, pd.DataFrame) and isinstance(response.columns, pd.MultiIndex):
+        # A date range comes back wide; keep every date as long (Dates, Instrument, Value) rows
+        series = split_series(call['fields'], response)
+        for field in call['fields']:
+            frame = series.get(field)
+            if frame is None:
+                block = empty.assign(Dates = pd.Series(dtype = 'datetime64[ns]'))
+            else:
+                block = (frame.rename_axis(index = 'Dates', columns = 'Instrument').reset_index()
+                              .melt(id_vars = 'Dates', var_name = 'Instrument', value_name = 'Value'))
+            for name in call['names'][field]:
+                results[name] = block[['Dates', 'Instrument', 'Value']]
+        return results
+
+    if isinstance(response, pd.DataFrame) and 'Datatype' in response.columns:
+        # Datatypes come back in request order, so match them by position
+        blocks = [block for _, block in response.groupby('Datatype', sort=False)]
+    else:
+        blocks = []
+
+    for i, field in enumerate(call['fields']):
+        block = blocks[i][['Instrument', 'Value']].reset_index(drop=True) if i < len(blocks) else empty
+        # DSWS reports missing values and errors as strings; keep Value numeric
+        block = block.assign(Value = pd.to_numeric(block['Value'], errors = 'coerce'))
+        for name in call['names'][field]:
+            results[name] = block
+    return results
+
+
+
+
+def send_call(ds, call, retries=0, stats=None):
+    # Send one planned group as a multi-field get_data call, again up to retries times while DSWS returns nothing
+    started = time.perf_counter()
+    for attempt in range(retries + 1):
+        response = ds.get_data(tickers = call['tickers'],
+                               start = call['start'],
+                               end = call['end'],
+                               freq = call['freq'],
+                               fields = call['fields']
+                              )
+        if response is not None:
+            break
+
+    results = split_response(call, response)
+    if stats is not None:
+        stats.fetched(call, time.perf_counter() - started, results, attempt)
+    return results
+
+
+
+
+def send_bundle(ds, bundle, retries=0, stats=None):
+    # Pack planned groups into one GetDataBundle post and decode each response
+    started = time.perf_counter()
+    bundle_request = [ds.post_user_request(tickers = call['tickers'],
+                                           start = call['start'],
+                                           end = call['end'],
+                                           freq = call['freq'],
+                                           fields = call['fields'])
+                      for call in bundle]
+    for attempt in range(retries + 1):
+        responses = ds.get_bundle_data(bundleRequest = bundle_request)
+        if responses is not None:
+            break
+    responses = responses or []
+    seconds = time.perf_counter() - started
+
+    results = {}
+    for i, call in enumerate(bundle):
+        response = responses[i] if i < len(responses) else None
+        partial = split_response(call, response)
+        if stats is not None:
+            stats.fetched(call, seconds, partial, attempt)
+        merge_results(results, partial)
+    return results
+
+
+
+
+def plan_jobs(metric_requests, mode):
+    # Plan the requests once and pair each unit of work with its sender
+    if mode not in FETCH_MODES:
+        raise ValueError(f"Unknown fetch mode '{mode}', expected one of {FETCH_MODES}")
+
+    calls = plan_requests(metric_requests, max_fields = 1 if mode == 'single' else None)
+    if mode == 'bundle':
+        return [(send_bundle, bundle) for bundle in plan_bundles(calls)]
+    return [(send_call, call) for call in calls]
+
+
+
+
+def fetch_metrics(ds, metric_requests, mode='grouped', max_workers=1, retries=0, stats=None, on_result=None):
+    # Send the planned requests with the chosen fetch mode, recording each metric's fetch in stats (a FetchStats).
+    # on_result(partial) is called on the calling thread with every job's {name: frame} as it lands.
+    jobs = plan_jobs(metric_requests, mode)
+
+    results = {}
+    if max_workers <= 1:
+        for send, unit in jobs:
+            partial = send(ds, unit, retries, stats)
+            merge_results(results, partial)
+            if on_result is not None:
+                on_result(partial)
+        return results
+
+    # Send every job at once, at most max_workers in flight to respect DSWS rate limits
+    with ThreadPoolExecutor(max_workers = max_workers) as executor:
+        futures = [executor.submit(send, ds, unit, retries, stats) for send, unit in jobs]
+        for future in as_completed(futures):
+            partial = future.result()
+            merge_results(results, partial)
+            if on_result is not None:
+                on_result(partial)
+    return results
+
+
+
+
+#####################################################################################
+######################### Series Fetch ##############################
+#####################################################################################
+
+def split_series(fields, response):
+    # Map a time-series response back to one (dates x instruments) frame per field
+    series = {}
+    if not isinstance(response, pd.DataFrame) or response.empty:
+        return series
+
+    if isinstance(response.columns, pd.MultiIndex):
+        # Wide response: (Instrument, Field[, Currency]) columns indexed by date, fields in request order
+        echoed = response.columns.get_level_values('Field').unique()
+        for field, name in zip(fields, echoed):
+            frame = response.xs(name, axis = 1, level = 'Field')
+            if isinstance(frame.columns, pd.MultiIndex):
+                # Drop the Currency level DSWS adds alongside Instrument
+                frame.columns = frame.columns.get_level_values('Instrument')
+            frame.index = pd.to_datetime(frame.index)
+            series[field] = frame.apply(pd.to_numeric, errors = 'coerce')
+    elif 'Datatype' in response.columns and 'Dates' in response.columns:
+        # A single date comes back in long format (without its date for a single instrument and datatype)
+        for field, (_, block) in zip(fields, response.groupby('Datatype', sort = False)):
+            series[field] = pd.DataFrame([pd.to_numeric(block['Value'], errors = 'coerce').to_numpy()],
+                                         index = pd.to_datetime([block['Dates'].iloc[0]]),
+                                         columns = block['Instrument'].to_numpy())
+    return series
+
+
+
+
+def fetch_series(ds, tickers, fields, start, end, freq='D'):
+    # Fetch raw time series for every field, as few requests as the item limit allows
+    chunks = {}
+    for symbols in ticker_chunks(tickers):
+        fields_per_call = max(1, MAX_REQUEST_ITEMS // len(symbols.split(',')))
+        for i in range(0, len(fields), fields_per_call):
+            chunk = list(fields[i:i + fields_per_call])
+            response = ds.get_data(tickers = symbols, start = start, end = end, freq = freq, fields = chunk)
+            for field, frame in split_series(chunk, response).items():
+                chunks.setdefault(field, []).append(frame)
+
+    # Ticker chunks side by side
+    return {field: frames[0] if len(frames) == 1 else pd.concat(frames, axis = 1) for field, frames in chunks.items()}
+
+
+
+
+
+#####################################################################################
+######################### Async Fetch ##############################
+#####################################################################################
+
+async def send_call_async(client, call, retries=0, stats=None):
+    started = time.perf_counter()
+    for attempt in range(retries + 1):
+        response = await client.get_data(tickers = call['tickers'],
+                                         start = call['start'],
+                                         end = call['end'],
+                                         freq = call['freq'],
+                                         fields = call['fields']
+                                        )
+        if response is not None:
+            break
+
+    results = split_response(call, response)
+    if stats is not None:
+        stats.fetched(call, time.perf_counter() - started, results, attempt)
+    return results
+
+
+
+
+async def send_bundle_async(client, bundle, retries=0, stats=None):
+    started = time.perf_counter()
+    bundle_request = [client.post_user_request(tickers = call['tickers'],
+                                               start = call['start'],
+                                               end = call['end'],
+                                               freq = call['freq'],
+                                               fields = call['fields'])
+                      for call in bundle]
+    for attempt in range(retries + 1):
+        responses = await client.get_bundle_data(bundleRequest = bundle_request)
+        if responses is not None:
+            break
+    responses = responses or []
+    seconds = time.perf_counter() - started
+
+    results = {}
+    for i, call in enumerate(bundle):
+        response = responses[i] if i < len(responses) else None
+        partial = split_response(call, response)
+        if stats is not None:
+            stats.fetched(call, seconds, partial, attempt)
+        merge_results(results, partial)
+    return results
+
+
+
+
+async def fetch_metrics_async(client, metric_requests, mode='grouped', retries=0, stats=None, on_result=None):
+    # Run every planned request as a coroutine; the client semaphore bounds concurrency.
+    # Cancelling this coroutine cancels every request still in flight.
+    senders = {send_call: send_call_async, send_bundle: send_bundle_async}
+    jobs = plan_jobs(metric_requests, mode)
+
+    results = {}
+    for future in asyncio.as_completed([senders[send](client, unit, retries, stats) for send, unit in jobs]):
+        partial = await future
+        merge_results(results, partial)
+        if on_result is not None:
+            on_result(partial)
+    return results
+
+
+
+
+
+#####################################################################################
+######################### Result Cache ##############################
+#####################################################################################
+
+# Process-wide TTL + LRU cache of per-metric results, keyed on (tickers, field, start, end, freq)
+class ResultCache:
+
+    def __init__(self, ttl=900, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # Future of every key being fetched upstream, so concurrent sessions wait for that one fetch
+        # of the same key instead of sending their own, while fetches of other keys go ahead
+        self.in_flight = {}
+
+
+    @staticmethod
+    def key(request):
+        return (request.tickers, request.field, request.start, request.end, request.freq)
+
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last = False)
+
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+    def lookup(self, metric_requests):
+        # Split requests into cached results and misses
+        results, misses = {}, []
+        for request in metric_requests:
+            value = self.get(self.key(request))
+            if value is None:
+                misses.append(request)
+            else:
+                results[request.name] = value
+        return results, misses
+
+
+    def fetch(self, metric_requests, fetch, stats=None, on_result=None):
+        # Serve cached metrics and fetch only the misses with fetch(requests) -> {name: frame}, recording hits in stats.
+        # With on_result, the cached results are passed to it first and fetch is called as fetch(requests, on_result).
+        results, misses = self.lookup(metric_requests)
+        if on_result is not None and results:
+            on_result(dict(results))
+
+        # Claim the misses no other session is fetching; wait for the rest. Results are cached before
+        # their key leaves in_flight, so a key that is neither may have just been filled by another session.
+        owned, waiting, filled = [], [], {}
+        with self.lock:
+            for request in misses:
+                key = self.key(request)
+                entry = self.entries.get(key)
+                if entry is not None and entry[0] >= time.monotonic():
+                    filled[request.name] = entry[1]
+                elif key in self.in_flight:
+                    waiting.append((request, self.in_flight[key]))
+                else:
+                    self.in_flight[key] = Future()
+                    owned.append(request)
+        results.update(filled)
+        if on_result is not None and filled:
+            on_result(filled)
+
+        if owned:
+            try:
+                fetched = fetch(owned, on_result) if on_result is not None else fetch(owned)
+            except BaseException as error:
+                self.release(owned, error = error)
+                raise
+            for request in owned:
+                value = fetched.get(request.name)
+                if value is not None and len(value):
+                    self.put(self.key(request), value)
+                results[request.name] = value
+            self.release(owned, fetched)
+
+        for request, future in waiting:
+            results[request.name] = future.result()
+            if on_result is not None:
+                on_result({request.name: results[request.name]})
+
+        if stats is not None:
+            for request in metric_requests:
+                if request not in owned and results.get(request.name) is not None:
+                    stats.cached(request.name, results[request.name])
+        return results
+
+
+    def release(self, owned, fetched=None, error=None):
+        # Hand the upstream results (or the failure) of owned requests to every session waiting on them
+        with self.lock:
+            futures = [(request, self.in_flight.pop(self.key(request), None)) for request in owned]
+        for request, future in futures:
+            if future is None or future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(fetched.get(request.name))
@@ -0,0 +1,224 @@
+###########################################
+########## Package Imports
+###########################################
+import hashlib, json, logging, os, random, threading, time
+from datetime import datetime as dt, timezone
+import pandas as pd
+import DatastreamDSWS as DSWS
+from fake_dsws import data_response
+from ds_client import PooledDatastream
+
+
+log = logging.getLogger('ds_replay')
+
+
+
+
+
+##############################################
+######## Data Sources
+##############################################
+
+# Every data source answers the DatastreamDSWS calls the fetch layer makes:
+#   get_data(tickers, fields, start, end, freq), post_user_request(...) and get_bundle_data(bundleRequest)
+#   dsws    live Datastream connection
+#   record  live connection saving every response as a fixture
+#   replay  recorded fixtures only, with injected latency and failures, no network or credentials
+DATA_SOURCES = ('dsws', 'record', 'replay')
+
+
+def request_key(tickers, fields=None, start='', end='', freq=''):
+    # Canonical fixture key of one data request, exactly as the fetch layer sent it
+    fields = [fields] if isinstance(fields, str) else list(fields or [])
+    return json.dumps({'tickers': tickers, 'fields': fields, 'start': start, 'end': end, 'freq': freq}, sort_keys = True)
+
+
+
+
+class FixtureStore:
+
+    # One recorded DataResponse, the JSON exactly as DSWS sent it, per request key, named by its hash
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok = True)
+
+
+    def path(self, key):
+        return os.path.join(self.root, hashlib.sha1(key.encode()).hexdigest() + '.json')
+
+
+    def load(self, key):
+        # Recorded DataResponse for key; KeyError when it was never recorded
+        try:
+            with open(self.path(key)) as f:
+                return json.load(f)['response']
+        except FileNotFoundError:
+            raise KeyError(key) from None
+
+
+    def save(self, key, response):
+        tmp = self.path(key) + f".{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump({'key': json.loads(key), 'response': response}, f)
+        os.replace(tmp, self.path(key))
+
+
+
+
+
+##############################################
+######## Recording Source
+##############################################
+
+class CapturingDatastream(PooledDatastream):
+
+    # Pooled connection that keeps the raw JSON of the last response each thread received,
+    # before the DSWS client decodes it into frames
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.captured = threading.local()
+
+
+    def _get_json_Response(self, reqUrl, raw_request):
+        self.captured.json = super()._get_json_Response(reqUrl, raw_request)
+        return self.captured.json
+
+
+
+
+class RecordingDatastream:
+
+    # Pass every call through to a live CapturingDatastream and keep the DataResponse JSON of each successful one
+    def __init__(self, ds, root):
+        self.ds = ds
+        self.fixtures = FixtureStore(root)
+
+
+    def get_data(self, tickers, fields=None, start='', end='', freq='', kind=1):
+        response = self.ds.get_data(tickers = tickers, fields = fields, start = start, end = end, freq = freq, kind = kind)
+        if isinstance(response, pd.DataFrame):
+            self.fixtures.save(request_key(tickers, fields, start, end, freq), self.ds.captured.json['DataResponse'])
+        return response
+
+
+    def post_user_request(self, tickers, fields=None, start='', end='', freq='', kind=1):
+        # Carry the fixture key alongside the real request into the bundle
+        return request_key(tickers, fields, start, end, freq), self.ds.post_user_request(tickers = tickers, fields = fields, start = start,
+                                                                                         end = end, freq = freq, kind = kind)
+
+
+    def get_bundle_data(self, bundleRequest=None, retName=False):
+        keys = [key for key, _ in bundleRequest or []]
+        responses = self.ds.get_bundle_data(bundleRequest = [request for _, request in bundleRequest or []], retName = retName)
+        if responses is not None:
+            for key, response, raw in zip(keys, responses, self.ds.captured.json['DataResponses']):
+                if isinstance(response, pd.DataFrame):
+                    self.fixtures.save(key, raw)
+        return responses
+
+
+
+
+
+##############################################
+######## Replay Source
+##############################################
+
+class ReplayDatastream:
+
+    # Serve recorded responses with DSWS-like behaviour:
+    #   latency     seconds every request takes, plus up to jitter seconds more
+    #   error_rate  share of requests that fail; like the DSWS client, a failed request returns None
+    #   synthesize  answer unrecorded requests with deterministic fake data instead of None
+    #   today       date relative start/end dates resolve against when synthesizing
+    def __init__(self, root, latency=0.0, jitter=0.0, error_rate=0.0, synthesize=False, seed=None, today=None):
+        self.fixtures = FixtureStore(root)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.synthesize = synthesize
+        self.today = pd.Timestamp(today or dt.now(timezone.utc).date()).normalize()
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.formatter = DSWS.Datastream.__new__(DSWS.Datastream)
+
+
+    def wait(self):
+        # Sleep like a round trip and decide whether this request fails
+        with self.lock:
+            self.request_count += 1
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            failed = self.random.random() < self.error_rate
+        time.sleep(delay)
+        return not failed
+
+
+    def lookup(self, key):
+        # DataResponse JSON for key: recorded, synthesized like a DSWS server would send it, or None
+        try:
+            return self.fixtures.load(key)
+        except KeyError:
+            if not self.synthesize:
+                log.warning("no fixture recorded for %s", key)
+                return None
+
+        request = json.loads(key)
+        data_request = {'Instrument': {'Value': request['tickers']},
+                        'DataTypes': [{'Value': field} for field in request['fields']],
+                        'Date': {'Start': request['start'], 'End': request['end'], 'Frequency': request['freq']}}
+        return data_response(data_request, self.today)
+
+
+    def decode(self, response):
+        # Frame the DSWS client itself makes of a DataResponse
+        return self.formatter._format_Response(response) if response is not None else None
+
+
+    def get_data(self, tickers, fields=None, start='', end='', freq='', kind=1):
+        if not self.wait():
+            log.warning("injected failure for get_data %s", tickers)
+            return None
+        return self.decode(self.lookup(request_key(tickers, fields, start, end, freq)))
+
+
+    def post_user_request(self, tickers, fields=None, start='', end='', freq='', kind=1):
+        return request_key(tickers, fields, start, end, freq)
+
+
+    def get_bundle_data(self, bundleRequest=None, retName=False):
+        if not self.wait():
+            log.warning("injected failure for a bundle of %d requests", len(bundleRequest or []))
+            return None
+        return [self.decode(self.lookup(key)) for key in bundleRequest or []]
+
+
+
+
+
+##############################################
+######## Source Selection
+##############################################
+
+def replay_settings(environ=os.environ):
+    # ReplayDatastream settings from DASHBOARD_REPLAY_* environment variables
+    return dict(latency = float(environ.get('DASHBOARD_REPLAY_LATENCY', 0.0)),
+                jitter = float(environ.get('DASHBOARD_REPLAY_JITTER', 0.0)),
+                error_rate = float(environ.get('DASHBOARD_REPLAY_ERROR_RATE', 0.0)),
+                synthesize = environ.get('DASHBOARD_REPLAY_SYNTHESIZE', '0') == '1',
+                seed = int(environ['DASHBOARD_REPLAY_SEED']) if 'DASHBOARD_REPLAY_SEED' in environ else None,
+                today = environ.get('DASHBOARD_REPLAY_TODAY'))
+
+
+
+
+def connect_source(source, fixture_dir, username=None, password=None, **replay):
+    # Connection for one of DATA_SOURCES
+    if source not in DATA_SOURCES:
+        raise ValueError(f"Unknown data source '{source}', expected one of {DATA_SOURCES}")
+    if source == 'replay':
+        return ReplayDatastream(fixture_dir, **replay)
+
+    if source == 'record':
+        return RecordingDatastream(CapturingDatastream(username = username, password = password), fixture_dir)
+    return PooledDatastream(username = username, password = password)
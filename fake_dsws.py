@@ -0,0 +1,177 @@
+###########################################
+########## Package Imports
+###########################################
+import json, re, threading, time, zlib
+from datetime import datetime as dt, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pandas as pd
+import DatastreamDSWS as DSWS
+
+
+
+
+
+##############################################
+######## Fake DSWS Responses
+##############################################
+
+# Path prefix the DSWS clients append GetToken / GetData / GetDataBundle to
+DSWS_PATH = "/DSWSClient/V1/DSService.svc/rest/"
+
+
+def resolve_date(value, today):
+    # Resolve DSWS relative ('-0d', '-90d', '-20Y') or absolute ('2024-06-28') dates
+    match = re.match(r"^-(\d+)([DWMY])$", value.strip().upper()) if value else None
+    if not value:
+        return today
+    if match:
+        n, unit = int(match.group(1)), match.group(2)
+        days = {'D': 1, 'W': 7, 'M': 30, 'Y': 365}[unit] * n
+        return today - timedelta(days = days)
+    return pd.Timestamp(value).normalize()
+
+
+def request_dates(date, today):
+    # Business-day (or month-end) dates covered by a data request
+    start = resolve_date(date['Start'], today)
+    end = resolve_date(date['End'], today) if date['End'] else start
+    if date['Frequency'] == 'M':
+        dates = pd.date_range(start, end, freq = 'ME')
+        return dates if len(dates) else pd.DatetimeIndex([end])
+    dates = pd.bdate_range(start, end)
+    return dates if len(dates) else pd.DatetimeIndex([end])
+
+
+def json_date(date):
+    return "/Date(%d+0000)/" % (pd.Timestamp(date).value // 10**6)
+
+
+def fake_value(symbol, datatype, date):
+    # Deterministic pseudo-random value per (symbol, datatype, date)
+    key = f"{symbol}|{datatype}|{pd.Timestamp(date):%Y-%m-%d}".encode()
+    return round((zlib.crc32(key) % 20000) / 100.0 - 50.0, 4)
+
+
+def data_response(data_request, today):
+    # Build one DSWS DataResponse for a DataRequest dictionary
+    dates = request_dates(data_request['Date'], today)
+    symbols = data_request['Instrument']['Value'].split(',')
+
+    datatype_values = []
+    for datatype in data_request['DataTypes']:
+        symbol_values = [{"Currency": "",
+                          "Symbol": symbol,
+                          "Type": 10,
+                          "Value": [fake_value(symbol, datatype['Value'], date) for date in dates]}
+                         for symbol in symbols]
+        datatype_values.append({"DataType": datatype['Value'], "SymbolValues": symbol_values})
+
+    return {"AdditionalResponses": None,
+            "DataTypeNames": None,
+            "DataTypeValues": datatype_values,
+            "Dates": [json_date(date) for date in dates],
+            "SymbolNames": None,
+            "Tag": None}
+
+
+
+
+
+##############################################
+######## Fake DSWS HTTP Server
+##############################################
+
+class FakeDSWSHandler(BaseHTTPRequestHandler):
+
+    # Shared server settings, overridden per server in serve()
+    latency = 0.0
+    token_lifetime = timedelta(hours = 24)
+    request_count = 0
+    bytes_sent = 0
+
+
+    def do_POST(self):
+        raw_request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        method = self.path.rsplit('/', 1)[-1]
+        today = pd.Timestamp(dt.now(timezone.utc).date())
+        type(self).request_count += 1
+        time.sleep(self.latency)
+
+        if method == 'GetToken':
+            expiry = dt.now(timezone.utc) + self.token_lifetime
+            body = {"Properties": None, "TokenExpiry": json_date(expiry.replace(tzinfo = None)), "TokenValue": "fake-token"}
+        elif method == 'GetData':
+            body = {"DataResponse": data_response(raw_request['DataRequest'], today), "Properties": None}
+        elif method == 'GetDataBundle':
+            body = {"DataResponses": [data_response(request, today) for request in raw_request['DataRequests']],
+                    "Properties": None}
+        else:
+            self.send_error(404)
+            return
+
+        payload = json.dumps(body).encode('utf-8')
+        type(self).bytes_sent += len(payload)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+    def log_message(self, *args):
+        pass
+
+
+
+
+def serve(port=0, latency=0.0):
+    # Start a fake DSWS server on a background thread and return it with its base URL
+    handler = type('Handler', (FakeDSWSHandler,), {'latency': latency, 'request_count': 0, 'bytes_sent': 0})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}{DSWS_PATH}"
+
+
+
+
+def connect_sync(url, username='fake', password='fake'):
+    # DatastreamDSWS.Datastream pointed at a fake server (its config file forces https)
+    ds = DSWS.Datastream.__new__(DSWS.Datastream)
+    ds.url = url
+    ds.username = username
+    ds.password = password
+    ds.tokenResp = ds._get_token()
+    return ds
+
+
+
+
+
+##############################################
+######## Sync vs Async Comparison
+##############################################
+
+if __name__ == '__main__':
+    import argparse
+    from ds_fetch import MetricRequest, fetch_metrics
+    from ds_async import run_fetch
+
+    parser = argparse.ArgumentParser(description = "Compare sync and async DSWS clients against a local fake server")
+    parser.add_argument('--latency', type = float, default = 0.2)
+    parser.add_argument('--metrics', type = int, default = 40)
+    parser.add_argument('--concurrency', type = int, default = 8)
+    args = parser.parse_args()
+
+    server, url = serve(latency = args.latency)
+    tickers = ','.join(f"SECT{i:02d}WD" for i in range(11))
+    plan = [MetricRequest(f"metric_{i}", f"PCH#(X,{i + 1}D)", tickers, "-0d", "-0d", "D") for i in range(args.metrics)]
+
+    t0 = time.perf_counter()
+    fetch_metrics(connect_sync(url), plan, mode = 'single')
+    t1 = time.perf_counter()
+    run_fetch('fake', 'fake', plan, mode = 'single', max_concurrency = args.concurrency, url = url)
+    t2 = time.perf_counter()
+
+    print(f"sync  : {t1 - t0:.2f}s for {args.metrics} requests")
+    print(f"async : {t2 - t1:.2f}s for {args.metrics} requests (concurrency {args.concurrency})")
+    server.shutdown()
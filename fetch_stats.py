@@ -0,0 +1,94 @@
+###########################################
+########## Package Imports
+###########################################
+import json, logging, threading, time
+from collections import deque
+import pandas as pd
+
+
+log = logging.getLogger('dashboard.timing')
+
+
+
+
+
+##############################################
+######## Fetch Statistics
+##############################################
+
+# Process-wide history of per-metric fetches and pipeline stage timings.
+# Every record is also written to the 'dashboard.timing' logger as one JSON object per line.
+#   fetch  name, seconds (upstream call the metric came back in), bytes and rows of its result,
+#          cache 'hit' or 'miss', retries, instruments
+#   stage  name, seconds
+class FetchStats:
+
+    def __init__(self, max_records=20000):
+        self.records = deque(maxlen = max_records)
+        self.lock = threading.Lock()
+
+
+    def record(self, kind, name, seconds, **fields):
+        entry = dict(time = time.time(), kind = kind, name = name, seconds = round(seconds, 6), **fields)
+        with self.lock:
+            self.records.append(entry)
+        log.info(json.dumps(entry))
+
+
+    def fetched(self, call, seconds, results, retries=0):
+        # One record per metric answered by a planned call
+        for names in call['names'].values():
+            for name in names:
+                frame = results.get(name)
+                self.record('fetch', name, seconds,
+                            bytes = int(frame.memory_usage(deep = True).sum()) if frame is not None else 0,
+                            rows = len(frame) if frame is not None else 0,
+                            cache = 'miss', retries = retries, instruments = len(call['tickers'].split(',')))
+
+
+    def cached(self, name, frame):
+        self.record('fetch', name, 0.0, bytes = int(frame.memory_usage(deep = True).sum()), rows = len(frame),
+                    cache = 'hit', retries = 0)
+
+
+    def stages(self, timings):
+        for name, seconds in timings.items():
+            self.record('stage', name, seconds)
+
+
+    def frame(self, kind=None):
+        with self.lock:
+            records = list(self.records)
+        df = pd.DataFrame(records) if records else pd.DataFrame(columns = ['time', 'kind', 'name', 'seconds'])
+        df['time'] = pd.to_datetime(df['time'], unit = 's')
+        return df[df['kind'] == kind] if kind else df
+
+
+    def summary(self, kind='fetch'):
+        # Per metric (or stage) latency percentiles, slowest p95 first; cache and retry totals for fetches
+        df = self.frame(kind)
+        if df.empty:
+            return pd.DataFrame()
+        upstream = df[df['cache'] == 'miss'] if kind == 'fetch' else df
+        seconds = upstream.groupby('name')['seconds']
+        summary = pd.DataFrame({'count': seconds.count(),
+                                'p50': seconds.quantile(0.5),
+                                'p95': seconds.quantile(0.95),
+                                'max': seconds.max()})
+        if kind == 'fetch':
+            by_name = df.groupby('name')
+            summary = summary.reindex(by_name.size().index)
+            summary['rows'] = by_name['rows'].mean()
+            summary['bytes'] = by_name['bytes'].mean()
+            summary['hit_rate'] = by_name['cache'].apply(lambda c: (c == 'hit').mean())
+            summary['retries'] = by_name['retries'].sum()
+        return summary.sort_values('p95', ascending = False)
+
+
+    def history(self, kind='stage', freq='1h'):
+        # p50 / p95 of every record of a kind per time bucket
+        df = self.frame(kind)
+        if df.empty:
+            return pd.DataFrame(columns = ['p50', 'p95'])
+        buckets = df.set_index('time')['seconds'].resample(freq)
+        return pd.DataFrame({'p50': buckets.quantile(0.5), 'p95': buckets.quantile(0.95)}).dropna()
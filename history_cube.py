@@ -0,0 +1,163 @@
+###########################################
+########## Package Imports
+###########################################
+import fcntl, json, os, threading
+from contextlib import contextmanager
+import numpy as np, pandas as pd
+
+
+
+
+
+##############################################
+######## History Cube
+##############################################
+
+# Index file inside the cube directory, and the lock file writers in every process take
+INDEX_FILE = 'index.json'
+LOCK_FILE = 'cube.lock'
+
+
+# Append-only float32 history of the dashboard, one (instrument x metric) slice per refresh.
+# Slices are only ever added to the cube file; INDEX_FILE names that file, lists the axes
+# and which slice holds each date, and is replaced atomically after the slice is on disk, so a
+# reader mapping the rows the index knows about never sees a partial write. Writers in every
+# process (page replicas, refresher.py) hold LOCK_FILE, and each slice is written at the offset
+# the index gives it, so a write the index never recorded is overwritten rather than shifting
+# every later slice. A date refreshed again points at its newest slice; new instruments or
+# metrics, or more superseded slices than live ones, rewrite the cube under a new name holding
+# one slice per date.
+class HistoryCube:
+
+    def __init__(self, root):
+        self.root = root
+        self.lock = threading.Lock()
+        self.mapped = (None, None, None)
+        os.makedirs(root, exist_ok = True)
+
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+
+    def index(self):
+        try:
+            with open(self.path(INDEX_FILE)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'file': 'cube-0.f32', 'instruments': [], 'metrics': [], 'dates': {}, 'slices': 0}
+
+
+    def write_index(self, index):
+        tmp = self.path(INDEX_FILE + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp, self.path(INDEX_FILE))
+
+
+    @contextmanager
+    def locked(self):
+        # Exclusive across threads and processes for as long as the block runs
+        with self.lock, open(self.path(LOCK_FILE), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+    def cube(self):
+        # (slices x instruments x metrics) read-only memory map, remapped when the index changes
+        try:
+            mtime = os.stat(self.path(INDEX_FILE)).st_mtime_ns
+        except FileNotFoundError:
+            return self.index(), np.zeros((0, 0, 0), dtype = np.float32)
+
+        if self.mapped[0] != mtime:
+            index = self.index()
+            shape = (index['slices'], len(index['instruments']), len(index['metrics']))
+            data = (np.memmap(self.path(index['file']), dtype = np.float32, mode = 'r', shape = shape)
+                    if index['slices'] else np.zeros(shape, dtype = np.float32))
+            self.mapped = (mtime, index, data)
+        return self.mapped[1], self.mapped[2]
+
+
+    def dates(self):
+        # Sorted as-of dates held in the cube
+        return sorted(self.index()['dates'])
+
+
+    def append(self, as_of, frame):
+        # Append the (instrument x metric) frame for as_of
+        with self.locked():
+            index = self.index()
+            if (list(frame.index) != index['instruments'] or list(frame.columns) != index['metrics']) and index['slices']:
+                index = self.reshape(index, list(pd.Index(index['instruments']).union(frame.index, sort = False)),
+                                     list(pd.Index(index['metrics']).union(frame.columns, sort = False)))
+            elif not index['slices']:
+                index.update(instruments = list(frame.index), metrics = list(frame.columns))
+
+            # Write at the slot after the last indexed slice, dropping anything an unfinished append left beyond it
+            values = frame.reindex(index = index['instruments'], columns = index['metrics']).to_numpy(dtype = np.float32)
+            offset = index['slices'] * values.nbytes
+            fd = os.open(self.path(index['file']), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                os.ftruncate(fd, offset)
+                os.pwrite(fd, values.tobytes(), offset)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+            index['dates'][as_of] = index['slices']
+            index['slices'] += 1
+            self.write_index(index)
+
+            # Intraday refreshes leave the date's earlier slices behind; drop them once they outnumber the live ones
+            if index['slices'] > 2 * len(index['dates']):
+                self.reshape(index, index['instruments'], index['metrics'])
+
+
+    def reshape(self, index, instruments, metrics):
+        # Rewrite the cube on the given (wider) axes with one slice per date, in date order, and swap it in
+        # (called holding the lock)
+        shape = (index['slices'], len(index['instruments']), len(index['metrics']))
+        data = np.memmap(self.path(index['file']), dtype = np.float32, mode = 'r', shape = shape)
+        old = pd.MultiIndex.from_product([index['instruments'], index['metrics']])
+        new = pd.MultiIndex.from_product([instruments, metrics])
+        positions = new.get_indexer(old)
+        dates = sorted(index['dates'])
+
+        widened = np.full((len(dates), len(new)), np.nan, dtype = np.float32)
+        widened[:, positions] = np.asarray(data).reshape(index['slices'], -1)[[index['dates'][date] for date in dates]]
+
+        generation = int(index['file'].split('-')[1].split('.')[0]) + 1
+        widened.tofile(self.path(f"cube-{generation}.f32"))
+        previous = index['file']
+        index = dict(index, file = f"cube-{generation}.f32", instruments = instruments, metrics = metrics,
+                     dates = {date: slot for slot, date in enumerate(dates)}, slices = len(dates))
+        self.write_index(index)
+        try:
+            os.remove(self.path(previous))
+        except OSError:
+            # Still mapped by a reader on platforms that lock mapped files
+            pass
+        return index
+
+
+    def frame(self, as_of):
+        # (instrument x metric) slice for as_of, None if the date isn't held
+        index, data = self.cube()
+        if as_of not in index['dates']:
+            return None
+        return pd.DataFrame(data[index['dates'][as_of]], index = index['instruments'], columns = index['metrics'])
+
+
+    def series(self, metric, start=None, end=None):
+        # (date x instrument) history of one metric, dates sorted
+        index, data = self.cube()
+        if metric not in index['metrics']:
+            return None
+        dates = sorted(date for date in index['dates'] if (start is None or date >= start) and (end is None or date <= end))
+        rows = [index['dates'][date] for date in dates]
+        return pd.DataFrame(data[rows, :, index['metrics'].index(metric)],
+                            index = pd.DatetimeIndex(dates), columns = index['instruments'])
@@ -0,0 +1,124 @@
+###########################################
+########## Package Imports
+###########################################
+from collections import namedtuple
+
+
+
+
+
+#####################################################################################
+######################### Metric Registry ##############################
+#####################################################################################
+
+# One dashboard metric:
+#   name        output column
+#   group/label MultiIndex row in the rendered table (label None keeps the metric hidden)
+#   field       DS expression fetched from Datastream
+#   universe    universe column supplying the tickers ('sector_ticker', 'sector_ticker_gl' or 'sector_ticker_ibes')
+#   freq        'D' or 'M'
+#   compare_90d also fetch the value 90 days ago and show an UP/DOWN trend arrow
+#   inputs      columns averaged into a locally derived metric instead of a DS field
+#   zscore      raw DS series whose 20-year z-score can be computed locally instead of fetching field
+#   sparkline   draw a one-year sparkline from the history cube next to the value
+# An entry with neither field nor inputs shows a metric defined elsewhere in the registry again.
+Metric = namedtuple('Metric', ['name', 'group', 'label', 'field', 'universe', 'freq', 'compare_90d', 'inputs', 'zscore', 'sparkline'],
+                    defaults = (None, 'sector_ticker', 'D', False, None, None, False))
+
+
+def get_super(x):
+    normal = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+-=()"
+    super_s = "ᴬᴮᶜᴰᴱᶠᴳᴴᴵᴶᴷᴸᴹᴺᴼᴾQᴿˢᵀᵁⱽᵂˣʸᶻᵃᵇᶜᵈᵉᶠᵍʰᶦʲᵏˡᵐⁿᵒᵖ۹ʳˢᵗᵘᵛʷˣʸᶻ⁰¹²³⁴⁵⁶⁷⁸⁹⁺⁻⁼⁽⁾"
+    res = x.maketrans(''.join(normal), ''.join(super_s))
+    return x.translate(res)
+
+
+
+
+# Every metric of the dashboard, in display order
+REGISTRY = [
+    Metric('mkt_cap', '', 'Market Cap (%)', '(X(MV)/TOTMKWD(MV))*100.00'),
+
+    # Performance
+    Metric('mtd_performance', 'Performance', 'MTD (%)', 'PCHV#(X,MTD)'),
+    Metric('ytd_performance', 'Performance', 'YTD (%)', 'PCHV#(X,YTD)'),
+    Metric('1y_performance', 'Performance', '1-Year (%)', 'PCH#(X,1Y)'),
+    Metric('3y_cagr', 'Performance', '3Yr CAGR (%)', 'GRFL#(X,3Y)'),
+
+    # Technicals
+    Metric('rsi_14', 'Technicals', '14-Day RSI', 'RSI#(X,14D)'),
+    Metric('breadth', 'Technicals', 'Breadth' + get_super("+") + ' (%)', '(LIST#(X,IF#(X-MAV#(X,200D),GT,ZERO),AVG))*100.00',
+           universe = 'sector_ticker_gl', compare_90d = True, sparkline = True),
+    Metric('rel_200d', 'Technicals', 'Rel. to 200Day (%)', '100*(REB#(X)/MAV#(REB#(X),200D)-1.00)', compare_90d = True, sparkline = True),
+    Metric('ad_line', 'Technicals', 'Advance/Decline Line', '100.000*MAV#(X(RS)/(X(FS)+X(RS)),1M)', compare_90d = True),
+
+    # Cyclicality
+    Metric('beta', 'Cyclicality', 'Sector Beta', 'REGB#(LN#(TOTMKWD/LAG#(TOTMKWD,1M)),LN#(X/LAG#(X,1M)),60M)', freq = 'M'),
+    Metric('rolling_corr', 'Cyclicality', 'Citi Eco. Surprice Corr. to Rel. Per.', 'CORR#(ACH#(GXCESIR,1M),PCH#(X/TOTMKWD,1M),60M)', freq = 'M'),
+    Metric('dxy_corr', 'Cyclicality', 'DXY Correlation', 'CORR#(PCH#(X,4W),PCH#(NDXYSPT,4W),200D)'),
+
+    # Earnings
+    Metric('earnings_rev_3m', 'Earnings', 'Earnings Revision Ratio' + get_super("++"), '(MAV#(PAD#((X(A12UPE)-X(A12DNE))/(X(A12UPE)+X(A12DNE))),3M))*100.00',
+           universe = 'sector_ticker_ibes', compare_90d = True, sparkline = True),
+    Metric('eps', 'Earnings', 'EPS Growth (YoY) (%)', 'PCH#(X(A12TE),1Y)', universe = 'sector_ticker_ibes', compare_90d = True, sparkline = True),
+    Metric('earning_growth_exp', 'Earnings', '12-Mth Fwd EPS Growth Exp. (%)', 'X(A12GRO)', universe = 'sector_ticker_ibes', compare_90d = True),
+    Metric('sales_growth', 'Earnings', 'Sales Growth (YoY) (%)', 'MAV#(PCH#(X(DWSL),1Y),3M)', compare_90d = True),
+    Metric('net_profit_margin', 'Earnings', 'Profit Margin (%)', 'X(DWNM)*1.00', compare_90d = True),
+
+    Metric('dividend', '', 'Dividend Yield', 'X(DY)'),
+
+    # Valuation
+    Metric('pe_ds', 'Valuation', 'Price Earnings', 'X(PE)'),
+    Metric('fwd_pe_ds', 'Valuation', 'Forward PE', 'X(DIPE)'),
+    Metric('price_book', 'Valuation', 'Price to Book', 'X(BP)'),
+    Metric('price_cash', 'Valuation', 'Price to Cash', 'X(PC)'),
+    Metric('price_sales', 'Valuation', 'Price to Sales', 'E062(X)'),
+    Metric('fwd_pe_ds_zscore', 'Valuation', None, '(X(DIPE)-AVG#(X(DIPE),-20Y,))/SDN#(X(DIPE),-20Y,)', zscore = 'X(DIPE)'),
+    Metric('price_book_zscore', 'Valuation', None, '(X(BP)-AVG#(X(BP),-20Y,))/SDN#(X(BP),-20Y,)', zscore = 'X(BP)'),
+    Metric('price_cash_zscore', 'Valuation', None, '(X(PC)-AVG#(X(PC),-20Y,))/SDN#(X(PC),-20Y,)', zscore = 'X(PC)'),
+    Metric('price_sales_zscore', 'Valuation', None, '(E062(X)-AVG#(E062(X),-20Y,))/SDN#(E062(X),-20Y,)', zscore = 'E062(X)'),
+    Metric('valuation_zscore', 'Valuation', 'Valuation Z-Score',
+           inputs = ('fwd_pe_ds_zscore', 'price_book_zscore', 'price_cash_zscore', 'price_sales_zscore')),
+
+    Metric('tupper_fwd_pe', '', 'Tupper Pre./Dis/ (%)', 'REBE#(X/TOTMKWD,MTE)-(REBE#(X/TOTMKWD,MTE))/(X(DIPE)/TOTMKWD(DIPE))', compare_90d = True,
+           sparkline = True),
+
+    # Operations
+    Metric('return_on_equity', 'Operations', 'Return on Equity (%)', 'X(DWRE)'),
+    Metric('net_profit_margin', 'Operations', 'Net Profit Margin (%)'),
+    Metric('ops_margin', 'Operations', 'Operating Margin (%)', 'X(DWEB)/X(DWSL)*100.00'),
+    Metric('return_on_equity_zscore', 'Operations', None, '(X(DWRE)-AVG#(X(DWRE),-20Y,))/SDN#(X(DWRE),-20Y,)', zscore = 'X(DWRE)'),
+    Metric('net_profit_margin_zscore', 'Operations', None, '(X(DWNM)-AVG#(X(DWNM),-20Y,))/SDN#(X(DWNM),-20Y,)', zscore = 'X(DWNM)'),
+    Metric('ops_margin_zscore', 'Operations', None, '(E063(X)-AVG#(E063(X),-20Y,))/SDN#(E063(X),-20Y,)', zscore = 'E063(X)'),
+    Metric('operations_zscore', 'Operations', 'Operation Z-Score',
+           inputs = ('return_on_equity_zscore', 'net_profit_margin_zscore', 'ops_margin_zscore')),
+]
+
+
+
+
+
+#####################################################################################
+######################### Registry Views ##############################
+#####################################################################################
+
+def fetched_metrics(registry=REGISTRY):
+    return [metric for metric in registry if metric.field]
+
+
+def zscore_metrics(registry=REGISTRY):
+    return [metric for metric in registry if metric.zscore]
+
+
+def derived_metrics(registry=REGISTRY):
+    return [metric for metric in registry if metric.inputs]
+
+
+def sparkline_metrics(registry=REGISTRY):
+    return [metric.name for metric in registry if metric.sparkline and metric.label is not None]
+
+
+def display_rows(registry=REGISTRY):
+    # (column, group, label, trend) for every shown row; trend rows get an UP/DOWN arrow at render time
+    return [(metric.name, metric.group, metric.label, metric.compare_90d)
+            for metric in registry if metric.label is not None]
@@ -0,0 +1,46 @@
+###########################################
+########## Package Imports
+###########################################
+import cProfile, os, pstats
+from datetime import datetime as dt
+import pandas as pd
+
+
+
+
+
+##############################################
+######## Build Profiler
+##############################################
+
+def start_profile():
+    # Deterministic profile of everything the calling thread runs from here on
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+
+
+def finish_profile(profiler, directory, top=30):
+    # Stop profiling, write the pstats file (snakeviz, flameprof and gprof2dot read it) and return it with the hotspots
+    profiler.disable()
+    os.makedirs(directory, exist_ok = True)
+    path = os.path.join(directory, f"build-{dt.now():%Y%m%d-%H%M%S}.prof")
+    profiler.dump_stats(path)
+    return path, hotspots(pstats.Stats(path), top)
+
+
+
+
+def hotspots(stats, top=30):
+    # Functions with the most time spent in their own code, with their call counts and cumulative time.
+    # calls counts recursive calls too, primitive_calls only those not made from inside the function itself.
+    rows = [dict(function = f"{func} ({os.path.basename(file)}:{line})",
+                 calls = calls,
+                 primitive_calls = primitive,
+                 own_s = own,
+                 cumulative_s = cumulative,
+                 per_call_ms = own / calls * 1000 if calls else 0.0)
+            for (file, line, func), (primitive, calls, own, cumulative, _) in stats.stats.items()]
+    return pd.DataFrame(rows).sort_values('own_s', ascending = False).head(top).reset_index(drop = True)
@@ -0,0 +1,203 @@
+###########################################
+########## Package Imports
+###########################################
+import argparse, logging, os, time
+from functools import lru_cache
+from datetime import datetime as dt, timedelta
+from zoneinfo import ZoneInfo
+from ds_fetch import fetch_metrics, fetch_series
+from ds_replay import connect_source, replay_settings
+import pandas as pd
+from dashboard_data import CORRELATION_WINDOW, backfill_snapshots, build_snapshot
+from fetch_stats import FetchStats
+from snapshot_store import SnapshotStore
+from history_cube import HistoryCube
+from series_store import SeriesStore
+from rolling import RollingCorrelationMatrix, RollingRegressions
+from zscore import ZScoreEngine
+
+
+log = logging.getLogger('refresher')
+
+
+
+
+
+##############################################
+######## Refresh Schedule
+##############################################
+
+def run_times(day, tz, interval, market_open, market_close, after_close):
+    # Every interval during market hours, then once after the close
+    start = dt.combine(day, market_open, tzinfo = tz)
+    close = dt.combine(day, market_close, tzinfo = tz)
+
+    times = []
+    t = start
+    while t <= close:
+        times.append(t)
+        t += interval
+    times.append(close + after_close)
+    return times
+
+
+
+
+def next_run(now, interval, market_open, market_close, after_close):
+    # First scheduled run strictly after now, skipping weekends
+    day = now.date()
+    for _ in range(8):
+        if day.weekday() < 5:
+            for t in run_times(day, now.tzinfo, interval, market_open, market_close, after_close):
+                if t > now:
+                    return t
+        day += timedelta(days = 1)
+
+
+
+
+
+##############################################
+######## Refresh Job
+##############################################
+
+@lru_cache(maxsize = 1)
+def connect():
+    # One connection for the life of the process, reusing its token across refreshes.
+    # Data source from DASHBOARD_DATA_SOURCE; credentials from the environment, falling back to the Streamlit secrets file
+    source = os.environ.get('DASHBOARD_DATA_SOURCE', 'dsws')
+    fixture_dir = os.environ.get('DASHBOARD_FIXTURE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures'))
+    if source == 'replay':
+        return connect_source(source, fixture_dir, **replay_settings())
+
+    username = os.environ.get('DSWS_USERNAME')
+    password = os.environ.get('DSWS_PASSWORD')
+    if not username:
+        import streamlit as st
+        username = st.secrets.credentials.username
+        password = st.secrets.credentials.password
+    return connect_source(source, fixture_dir, username, password)
+
+
+
+
+@lru_cache(maxsize = None)
+def series_store(root):
+    # One base series store per snapshot root for the life of the process, so warm series only fetch their new days
+    ds = connect()
+    return SeriesStore(os.path.join(root, 'base_series'), lambda tickers, fields, start, end: fetch_series(ds, tickers, fields, start, end))
+
+
+
+
+@lru_cache(maxsize = None)
+def zscore_engine(root):
+    # Z-score running sums kept for the life of the process over the same base series store
+    return ZScoreEngine(series_store(root))
+
+
+
+
+@lru_cache(maxsize = 1)
+def correlation_engine():
+    # Sector correlation matrix kept for the life of the process, each refresh adding only the new days
+    return RollingCorrelationMatrix(CORRELATION_WINDOW)
+
+
+
+
+@lru_cache(maxsize = 1)
+def regression_engines():
+    # Rolling betas and correlations kept for the life of the process, each refresh adding only the new days
+    return RollingRegressions()
+
+
+
+
+def refresh(store, mode='bundle', workers=4):
+    # Build a fresh snapshot and publish it atomically for the dashboard to read
+    started = time.perf_counter()
+    ds = connect()
+    as_of = dt.today().strftime('%Y-%m-%d')
+
+    # Per-metric fetches and stage timings go to the 'dashboard.timing' log
+    stats, timings = FetchStats(), {}
+    snapshot = build_snapshot(lambda metric_requests: fetch_metrics(ds, metric_requests, mode = mode, max_workers = workers,
+                                                                    retries = 2, stats = stats),
+                              zscores = zscore_engine(store.root), fetch_series = series_store(store.root), timings = timings,
+                              correlation_engine = correlation_engine(), regressions = regression_engines())
+    stats.stages(timings)
+    store.save(as_of, snapshot)
+    HistoryCube(os.path.join(store.root, 'cube')).append(as_of, snapshot.frame)
+    log.info("published snapshot %s in %.1fs", as_of, time.perf_counter() - started)
+
+
+
+
+def backfill(store, start, end, freq='B', mode='bundle', workers=4):
+    # Build every missing as-of date between start and end from one set of range requests
+    started = time.perf_counter()
+    stored = set(store.dates())
+    missing = [date.strftime('%Y-%m-%d') for date in pd.date_range(start, end, freq = freq)
+               if date.strftime('%Y-%m-%d') not in stored]
+    if not missing:
+        log.info("nothing to backfill between %s and %s", start, end)
+        return
+
+    ds = connect()
+    snapshots = backfill_snapshots(lambda metric_requests: fetch_metrics(ds, metric_requests, mode = mode, max_workers = workers),
+                                   missing, fetch_series = series_store(store.root))
+
+    cube = HistoryCube(os.path.join(store.root, 'cube'))
+    for as_of, snapshot in snapshots.items():
+        store.save(as_of, snapshot)
+        cube.append(as_of, snapshot.frame)
+    log.info("backfilled %d snapshots in %.1fs", len(snapshots), time.perf_counter() - started)
+
+
+
+
+
+##############################################
+######## Scheduler Loop
+##############################################
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = "Refresh the Global Equity Dashboard snapshot on a schedule")
+    parser.add_argument('--snapshot-dir', default = os.environ.get('DASHBOARD_SNAPSHOT_DIR',
+                        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'snapshots')))
+    parser.add_argument('--interval', type = int, default = 15, help = "minutes between refreshes during market hours")
+    parser.add_argument('--market-open', default = '08:00')
+    parser.add_argument('--market-close', default = '16:30')
+    parser.add_argument('--after-close', type = int, default = 30, help = "minutes after the close for the final refresh")
+    parser.add_argument('--timezone', default = 'Europe/London')
+    parser.add_argument('--mode', default = 'bundle')
+    parser.add_argument('--workers', type = int, default = 4)
+    parser.add_argument('--once', action = 'store_true', help = "refresh once and exit")
+    parser.add_argument('--backfill', nargs = 2, metavar = ('START', 'END'), help = "backfill missing snapshots between two dates and exit")
+    parser.add_argument('--backfill-freq', default = 'B', help = "pandas frequency of backfilled dates, e.g. B, W-FRI, BME")
+    args = parser.parse_args()
+
+    logging.basicConfig(level = logging.INFO, format = "%(asctime)s %(name)s %(levelname)s %(message)s")
+    store = SnapshotStore(args.snapshot_dir)
+    tz = ZoneInfo(args.timezone)
+    schedule = dict(interval = timedelta(minutes = args.interval),
+                    market_open = dt.strptime(args.market_open, '%H:%M').time(),
+                    market_close = dt.strptime(args.market_close, '%H:%M').time(),
+                    after_close = timedelta(minutes = args.after_close))
+
+    if args.backfill:
+        backfill(store, *args.backfill, freq = args.backfill_freq, mode = args.mode, workers = args.workers)
+        raise SystemExit
+
+    # Publish once on start so a fresh deploy never waits for the next slot
+    refresh(store, args.mode, args.workers)
+
+    while not args.once:
+        wake = next_run(dt.now(tz), **schedule)
+        log.info("next refresh at %s", wake.isoformat())
+        time.sleep(max(0.0, (wake - dt.now(tz)).total_seconds()))
+        try:
+            refresh(store, args.mode, args.workers)
+        except Exception:
+            log.exception("refresh failed, keeping the last published snapshot")
@@ -0,0 +1,251 @@
+###########################################
+########## Package Imports
+###########################################
+import threading
+from collections import deque
+import numpy as np, pandas as pd
+
+
+
+
+
+##############################################
+######## Vectorized Window Sums
+##############################################
+
+# Every function works on (dates x columns) arrays; a single column broadcasts across the others
+
+def window_sum(a, start):
+    # Sum of rows start[t]..t for every row t, NaN counted as zero
+    total = np.vstack([np.zeros((1, a.shape[1])), np.cumsum(np.nan_to_num(a), axis = 0)])
+    return total[1:] - total[start]
+
+
+def column_means(a, valid):
+    return np.where(valid, a, 0.0).sum(axis = 0) / valid.sum(axis = 0).clip(min = 1)
+
+
+def window_moments(a, b, start):
+    # Count and centred second moments over rows start[t]..t, pairwise-valid rows only
+    a, b = np.broadcast_arrays(a, b)
+    valid = ~np.isnan(a) & ~np.isnan(b)
+
+    # Centre each column first so the cumulative sums don't cancel
+    a = np.where(valid, a - column_means(a, valid), 0.0)
+    b = np.where(valid, b - column_means(b, valid), 0.0)
+
+    n = window_sum(valid.astype(float), start)
+    sa, sb = window_sum(a, start), window_sum(b, start)
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        saa = window_sum(a * a, start) - sa * sa / n
+        sbb = window_sum(b * b, start) - sb * sb / n
+        sab = window_sum(a * b, start) - sa * sb / n
+    return n, saa, sbb, sab
+
+
+def beta_corr(n, saa, sbb, sab):
+    # Slope of b on a and the correlation of a and b from window moments, NaN below two observations
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        beta = np.where(n > 1, sab / saa, np.nan)
+        corr = np.where(n > 1, sab / np.sqrt(saa * sbb), np.nan)
+    return beta, corr
+
+
+def window_starts(dates, window):
+    # First row of the window ending on every row: the last `window` rows for an int, rows after t - window for an offset
+    if isinstance(window, int):
+        return np.clip(np.arange(len(dates)) - window + 1, 0, None)
+    return dates.searchsorted(dates - window, side = 'right')
+
+
+
+
+
+##############################################
+######## Rolling Regression Engine
+##############################################
+
+# Rolling beta and correlation of every column of y on x over a trailing window, either a number of
+# rows or a date offset. fit() computes the full history in one cumulative-sum pass; update() adds
+# one day to the running sums and drops the days leaving the window, so a new day costs O(columns).
+class RollingRegression:
+
+    def __init__(self, window):
+        self.window = window
+        self.x = self.y = None
+        self.beta = self.corr = None
+        self.lock = threading.Lock()
+
+
+    def fit(self, x, y):
+        # x, y: (dates x instruments) frames on the same dates; returns the beta and correlation histories
+        a, b = x.to_numpy(dtype = float), y.to_numpy(dtype = float)
+        beta, corr = beta_corr(*window_moments(a, b, window_starts(x.index, self.window)))
+        self.x, self.y = x, y
+        self.beta = pd.DataFrame(beta, index = y.index, columns = y.columns)
+        self.corr = pd.DataFrame(corr, index = y.index, columns = y.columns)
+
+        # Running sums of the window ending on the last row, taken around a fixed shift for numerical stability
+        self.shift = (column_means(a, ~np.isnan(a)), column_means(b, ~np.isnan(b)))
+        self.rows = deque()
+        self.sums = np.zeros((6, b.shape[1]))
+        first = window_starts(x.index, self.window)[-1] if len(x) else 0
+        for date, row_a, row_b in zip(x.index[first:], a[first:], b[first:]):
+            self.add(date, row_a, row_b)
+        return self.beta, self.corr
+
+
+    def add(self, date, row_a, row_b):
+        # (n, sa, sb, saa, sbb, sab) of one day into the running sums, then out with the days that left the window
+        row_a, row_b = row_a - self.shift[0], row_b - self.shift[1]
+        valid = ~np.isnan(row_a) & ~np.isnan(row_b)
+        row_a, row_b = np.where(valid, row_a, 0.0), np.where(valid, row_b, 0.0)
+        terms = np.array([valid, row_a, row_b, row_a * row_a, row_b * row_b, row_a * row_b], dtype = float)
+        self.rows.append((date, terms))
+        self.sums += terms
+        while len(self.rows) > self.window if isinstance(self.window, int) else self.rows[0][0] <= date - self.window:
+            self.sums -= self.rows.popleft()[1]
+
+
+    def update(self, date, x, y):
+        # Add one day of x and y (per instrument) and return its beta and correlation
+        row_a = pd.Series(x).reindex(self.x.columns).to_numpy(dtype = float)
+        row_b = pd.Series(y).reindex(self.y.columns).to_numpy(dtype = float)
+        self.add(date, row_a, row_b)
+        n, sa, sb, saa, sbb, sab = self.sums
+        with np.errstate(invalid = 'ignore', divide = 'ignore'):
+            beta, corr = beta_corr(n, saa - sa * sa / n, sbb - sb * sb / n, sab - sa * sb / n)
+
+        self.x.loc[date], self.y.loc[date] = row_a, row_b
+        self.beta.loc[date], self.corr.loc[date] = beta, corr
+        return self.beta.loc[date], self.corr.loc[date]
+
+
+    def extend(self, x, y):
+        # Histories up to the end of x and y: one update per day after the last one seen, a full fit when
+        # nothing was seen yet, the columns differ, x doesn't continue from the last day or a day still
+        # inside the window was revised
+        with self.lock:
+            if self.x is None or not self.y.columns.equals(y.columns) or not len(x) or self.x.index[-1] not in x.index:
+                return self.fit(x, y)
+            held = pd.DatetimeIndex([date for date, _ in self.rows])
+            held = held[held.isin(x.index)]
+            if not (np.array_equal(self.x.loc[held].to_numpy(), x.loc[held].to_numpy(dtype = float), equal_nan = True) and
+                    np.array_equal(self.y.loc[held].to_numpy(), y.loc[held].to_numpy(dtype = float), equal_nan = True)):
+                return self.fit(x, y)
+            self.x, self.y = self.x.copy(), self.y.copy()
+            for date in x.index[x.index > self.x.index[-1]]:
+                self.update(date, x.loc[date], y.loc[date])
+            return self.beta, self.corr
+
+
+
+
+# One RollingRegression per key (an expression over a universe), created the first time the key is seen
+class RollingRegressions:
+
+    def __init__(self):
+        self.engines = {}
+        self.lock = threading.Lock()
+
+
+    def extend(self, key, window, x, y):
+        with self.lock:
+            engine = self.engines.get(key)
+            if engine is None or engine.window != window:
+                engine = self.engines[key] = RollingRegression(window)
+        return engine.extend(x, y)
+
+
+
+
+
+##############################################
+######## Rolling Correlation Matrix
+##############################################
+
+# Pairwise correlation matrix of every column against every other over the last `window` rows.
+# The window is held as sums, masked sums and cross products, so a new row is two rank-one
+# updates of (columns x columns) matrices rather than a recomputation over the window.
+# Non-finite returns (a zero or missing price) are left out like missing ones.
+class RollingCorrelationMatrix:
+
+    def __init__(self, window):
+        self.window = window
+        self.rows = deque()
+        self.last = None
+        self.lock = threading.Lock()
+
+
+    def fit(self, returns):
+        # returns: (dates x instruments) frame; keeps the trailing window and returns its matrix
+        values = returns.to_numpy(dtype = float)
+        self.columns = returns.columns
+        self.shift = column_means(values, np.isfinite(values))
+        self.rows = deque()
+        self.last = returns.index[-1] if len(returns) else None
+
+        # Whole window in one set of matrix products, then the dated rows it holds for later removal
+        window = values[-self.window:] - self.shift
+        valid = np.isfinite(window)
+        window = np.where(valid, window, 0.0)
+        mask = valid.astype(float)
+        self.sums = np.array([mask.T @ mask, window.T @ mask, (window * window).T @ mask, window.T @ window])
+        self.rows.extend(zip(returns.index[-self.window:], window, mask))
+        return self.matrix()
+
+
+    def terms(self, row):
+        # Shifted values with non-finite ones zeroed, and their validity mask, of one day of returns
+        values = pd.Series(row).reindex(self.columns).to_numpy(dtype = float) - self.shift
+        valid = np.isfinite(values)
+        return np.where(valid, values, 0.0), valid.astype(float)
+
+
+    def update(self, row):
+        # Add one day of returns (per instrument), drop the day leaving the window, return the new matrix
+        values, mask = self.terms(row)
+        self.rows.append((getattr(row, 'name', None), values, mask))
+        self.sums += self.outer(values, mask)
+        if len(self.rows) > self.window:
+            self.sums -= self.outer(*self.rows.popleft()[1:])
+        self.last = getattr(row, 'name', None)
+        return self.matrix()
+
+
+    def revise(self, returns):
+        # Swap every held day whose returns changed (today's provisional close, a revised print) for its new row
+        for i, (date, values, mask) in enumerate(self.rows):
+            if date in returns.index:
+                new_values, new_mask = self.terms(returns.loc[date])
+                if not (np.array_equal(new_values, values) and np.array_equal(new_mask, mask)):
+                    self.sums += self.outer(new_values, new_mask) - self.outer(values, mask)
+                    self.rows[i] = (date, new_values, new_mask)
+
+
+    def extend(self, returns):
+        # Matrix at the end of returns: held days re-applied where their returns changed, then one update per
+        # row after the last one seen; a full fit when nothing was seen yet, the columns differ or returns
+        # doesn't continue from the last row
+        with self.lock:
+            if self.last is None or not returns.columns.equals(self.columns) or self.last not in returns.index:
+                return self.fit(returns)
+            self.revise(returns)
+            matrix = self.matrix()
+            for _, row in returns[returns.index > self.last].iterrows():
+                matrix = self.update(row)
+            return matrix
+
+
+    def outer(self, values, mask):
+        return np.array([np.outer(mask, mask), np.outer(values, mask), np.outer(values * values, mask), np.outer(values, values)])
+
+
+    def matrix(self):
+        # count[i, j], sums[i, j] = sum of column i over rows where j is valid, and so on
+        count, sums, squares, products = self.sums
+        with np.errstate(invalid = 'ignore', divide = 'ignore'):
+            covariance = products - sums * sums.T / count
+            variance = squares - sums * sums / count
+            corr = np.where(count > 1, covariance / np.sqrt(variance * variance.T), np.nan)
+        return pd.DataFrame(corr, index = self.columns, columns = self.columns)
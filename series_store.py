@@ -0,0 +1,92 @@
+###########################################
+########## Package Imports
+###########################################
+import hashlib, os, threading, time
+import pandas as pd
+
+
+
+
+
+##############################################
+######## Base Series Store
+##############################################
+
+# Drop-in fetch_series(tickers, fields, start, end) keeping every (tickers, field) daily series on disk.
+# A series is pulled in full once, from the earliest start date ever asked for; after that only the days
+# since its last stored date are fetched, at most once every max_age seconds. start is a YYYY-MM-DD date.
+class SeriesStore:
+
+    def __init__(self, root, fetch_series, max_age=15 * 60):
+        # fetch_series(tickers, fields, start, end) -> {field: (dates x instruments) frame}
+        self.root = root
+        self.fetch_series = fetch_series
+        self.max_age = max_age
+        self.state = {}
+        self.lock = threading.Lock()
+        os.makedirs(root, exist_ok = True)
+
+
+    def path(self, tickers, field):
+        key = hashlib.sha1(f"{tickers}|{field}".encode()).hexdigest()[:16]
+        return os.path.join(self.root, f"{key}.parquet")
+
+
+    def load(self, tickers, field):
+        # (history, first start date it covers, monotonic time of its last fetch); None if never stored
+        if (tickers, field) in self.state:
+            return self.state[(tickers, field)]
+        try:
+            history = pd.read_parquet(self.path(tickers, field))
+        except (FileNotFoundError, OSError):
+            return None
+        first = pd.Timestamp(history.attrs.pop('first'))
+        return history, first, 0.0
+
+
+    def save(self, tickers, field, history, first):
+        path = self.path(tickers, field)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        stored = history.copy()
+        stored.attrs['first'] = first.strftime('%Y-%m-%d')
+        stored.to_parquet(tmp)
+        os.replace(tmp, path)
+        self.state[(tickers, field)] = (history, first, time.monotonic())
+
+
+    def __call__(self, tickers, fields, start, end):
+        start = pd.Timestamp(start)
+        with self.lock:
+            loaded = {field: self.load(tickers, field) for field in fields}
+
+            # Missing or not deep enough: the full pull; stored but stale: only the tail, from a week before the
+            # last stored date so recent revisions are picked up and the response is always a date range
+            cold = [field for field in fields if loaded[field] is None or loaded[field][1] > start]
+            stale = [field for field in fields if field not in cold
+                     and time.monotonic() - loaded[field][2] > self.max_age]
+
+            fetched = {}
+            if cold:
+                fetched.update(self.fetch_series(tickers, cold, start.strftime('%Y-%m-%d'), end))
+            if stale:
+                since = min(loaded[field][0].index.max() for field in stale) - pd.Timedelta(days = 7)
+                fetched.update(self.fetch_series(tickers, stale, since.strftime('%Y-%m-%d'), end))
+
+            series = {}
+            for field in fields:
+                new = fetched.get(field)
+                refreshed = new is not None and len(new) > 0
+                if field in cold:
+                    if not refreshed:
+                        # Nothing came back: no series rather than a shorter stored one, and nothing saved
+                        continue
+                    history = new.sort_index()
+                    self.save(tickers, field, history, start)
+                else:
+                    history, first, _ = loaded[field]
+                    if refreshed:
+                        # Replace the overlapping days along with the new ones
+                        history = pd.concat([history[history.index < new.index.min()], new]).sort_index()
+                        self.save(tickers, field, history, first)
+                series[field] = history[history.index >= start]
+            return series
@@ -0,0 +1,165 @@
+###########################################
+########## Package Imports
+###########################################
+import bisect, os, shutil, tempfile, threading, time
+from collections import namedtuple
+import pandas as pd
+
+
+
+
+
+##############################################
+######## Snapshot Store
+##############################################
+
+# File names inside each as-of directory
+SECTOR_FILE = 'sector_frame.parquet'
+IMPROVED_FILE = 'improved.parquet'
+METRICS_FILE = 'metrics.parquet'
+CORRELATION_FILE = 'correlations.parquet'
+HISTORY_FILE = 'histories.parquet'
+
+
+# Float (sector x metric) frame, boolean (sector x trend metric) improved-vs-90-days frame, raw per-metric results,
+# and when they were computed locally the (sector x sector) return correlation matrix and the rolling beta and
+# correlation histories as {metric name: (dates x sector) frame}
+Snapshot = namedtuple('Snapshot', ['frame', 'improved', 'metric_data', 'correlations', 'histories'], defaults = (None, None))
+
+
+# Prefix of the hidden version directories every snapshot is written to, and the seconds a replaced
+# version is kept for readers still inside it
+VERSION_PREFIX = '.v-'
+VERSION_GRACE = 10 * 60
+
+
+# Parquet store of the assembled sector frame and the raw per-metric results, one entry per as-of date.
+# Each publish writes a new hidden version directory and then swaps the as-of symlink to it with one
+# os.replace, so readers in every process see either the previous snapshot or the new one, never none.
+class SnapshotStore:
+
+    def __init__(self, root):
+        self.root = root
+        self.index = (None, [])
+        os.makedirs(root, exist_ok = True)
+
+
+    def path(self, as_of):
+        return os.path.join(self.root, as_of)
+
+
+    def dates(self):
+        # Sorted as-of dates that have a complete snapshot, rescanned only when a snapshot is published
+        mtime = os.stat(self.root).st_mtime_ns
+        if self.index[0] != mtime:
+            self.index = (mtime, sorted(name for name in os.listdir(self.root)
+                                        if not name.startswith('.') and os.path.isfile(os.path.join(self.root, name, SECTOR_FILE))))
+        return self.index[1]
+
+
+    def nearest(self, as_of):
+        # Latest as-of date on or before as_of by binary search over the sorted dates, None if there is none
+        dates = self.dates()
+        i = bisect.bisect_right(dates, as_of)
+        return dates[i - 1] if i else None
+
+
+    def latest(self):
+        # Most recent published as-of date, None if the store is empty
+        dates = self.dates()
+        return dates[-1] if dates else None
+
+
+    def age(self, as_of):
+        # Seconds since the snapshot was published, None if it doesn't exist
+        path = os.path.join(self.path(as_of), SECTOR_FILE)
+        if not os.path.isfile(path):
+            return None
+        return time.time() - os.path.getmtime(path)
+
+
+    def save(self, as_of, snapshot):
+        # Raw results go to one long (metric, Instrument, Value) table
+        metrics = pd.concat([result[['Instrument', 'Value']].assign(metric = name)
+                             for name, result in snapshot.metric_data.items() if result is not None],
+                            ignore_index = True)
+
+        staging = tempfile.mkdtemp(prefix = f'{VERSION_PREFIX}{as_of}-', dir = self.root)
+        os.chmod(staging, 0o755)
+        snapshot.frame.to_parquet(os.path.join(staging, SECTOR_FILE))
+        snapshot.improved.to_parquet(os.path.join(staging, IMPROVED_FILE))
+        metrics[['metric', 'Instrument', 'Value']].to_parquet(os.path.join(staging, METRICS_FILE), index = False)
+        if snapshot.correlations is not None:
+            snapshot.correlations.to_parquet(os.path.join(staging, CORRELATION_FILE))
+        if snapshot.histories:
+            # One long (metric, Date, sector, Value) table
+            histories = pd.concat([history.rename_axis(index = 'Date', columns = None).reset_index()
+                                   .melt(id_vars = 'Date', var_name = 'sector', value_name = 'Value').assign(metric = name)
+                                   for name, history in snapshot.histories.items()], ignore_index = True)
+            histories[['metric', 'Date', 'sector', 'Value']].to_parquet(os.path.join(staging, HISTORY_FILE), index = False)
+
+        # Point the as-of link at the finished version
+        target = self.path(as_of)
+        if os.path.isdir(target) and not os.path.islink(target):
+            # Written by an older version of the store as a plain directory: retire it once like a replaced version
+            try:
+                os.replace(target, os.path.join(self.root, f"{VERSION_PREFIX}{as_of}-legacy-{os.getpid()}"))
+            except FileNotFoundError:
+                pass
+        previous = os.readlink(target) if os.path.islink(target) else None
+        link = os.path.join(self.root, f".{as_of}-link-{os.getpid()}-{threading.get_ident()}")
+        os.symlink(os.path.basename(staging), link)
+        os.replace(link, target)
+
+        # The replaced version's grace period starts now
+        if previous is not None:
+            try:
+                os.utime(self.path(previous))
+            except FileNotFoundError:
+                pass
+        self.prune()
+
+
+    def prune(self):
+        # Remove versions no as-of link points at any more (replaced, or left by a failed publish)
+        # once readers have had time to finish with them
+        links = {os.readlink(self.path(name)) for name in os.listdir(self.root) if os.path.islink(self.path(name))}
+        now = time.time()
+        for name in os.listdir(self.root):
+            if name.startswith(VERSION_PREFIX) and name not in links:
+                try:
+                    if now - os.path.getmtime(self.path(name)) > VERSION_GRACE:
+                        shutil.rmtree(self.path(name), ignore_errors = True)
+                except FileNotFoundError:
+                    pass
+
+
+    def load(self, as_of, max_age=None):
+        # Memory-map the snapshot for as_of; None if missing or older than max_age seconds
+        age = self.age(as_of)
+        if age is None or (max_age is not None and age > max_age):
+            return None
+
+        # Read every file from the one version the link points at now, even if it is swapped meanwhile
+        version = os.path.realpath(self.path(as_of))
+        try:
+            frame = pd.read_parquet(os.path.join(version, SECTOR_FILE), memory_map = True)
+            improved = pd.read_parquet(os.path.join(version, IMPROVED_FILE), memory_map = True)
+            metrics = pd.read_parquet(os.path.join(version, METRICS_FILE), memory_map = True)
+        except FileNotFoundError:
+            # Written in an older layout
+            return None
+
+        metric_data = {name: result[['Instrument', 'Value']].reset_index(drop = True)
+                       for name, result in metrics.groupby('metric', sort = False)}
+
+        # Optional: only snapshots built with local series carry a correlation matrix and rolling histories
+        correlation_path = os.path.join(version, CORRELATION_FILE)
+        correlations = pd.read_parquet(correlation_path, memory_map = True) if os.path.isfile(correlation_path) else None
+        history_path = os.path.join(version, HISTORY_FILE)
+        histories = None
+        if os.path.isfile(history_path):
+            histories = {name: history.pivot(index = 'Date', columns = 'sector', values = 'Value')
+                                      .reindex(columns = history['sector'].unique()).rename_axis(index = None, columns = None)
+                         for name, history in pd.read_parquet(history_path).groupby('metric', sort = False)}
+        return Snapshot(frame, improved, metric_data, correlations, histories)
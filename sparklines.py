@@ -0,0 +1,90 @@
+###########################################
+########## Package Imports
+###########################################
+import base64, threading
+from collections import OrderedDict
+import numpy as np, pandas as pd
+
+
+
+
+
+##############################################
+######## Sparkline Rendering
+##############################################
+
+# Points per sparkline, pixel size and line colour
+SPARK_POINTS = 60
+SPARK_WIDTH = 60
+SPARK_HEIGHT = 14
+SPARK_COLOR = '#555555'
+
+
+def sparkline_svgs(history, points=SPARK_POINTS, width=SPARK_WIDTH, height=SPARK_HEIGHT):
+    # {column: <img> tag} for a (dates x columns) history, every column downsampled and scaled in one pass
+    if len(history) < 2:
+        return {}
+
+    # Evenly spaced rows, always keeping the latest
+    rows = np.unique(np.linspace(0, len(history) - 1, min(points, len(history))).round().astype(int))
+    sampled = history.ffill().iloc[rows]
+    values = sampled.to_numpy(dtype = float)
+
+    # Scale each column into the box, flat lines drawn through the middle
+    low, high = sampled.min().to_numpy(dtype = float), sampled.max().to_numpy(dtype = float)
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        scaled = np.where(high > low, (values - low) / (high - low), values * 0 + 0.5)
+    x = np.linspace(0, width, len(rows))
+    y = height - 1 - scaled * (height - 2)
+
+    svgs = {}
+    for j, column in enumerate(history.columns):
+        valid = ~np.isnan(y[:, j])
+        if valid.sum() < 2:
+            continue
+        coords = ' '.join(f"{a:.1f},{b:.1f}" for a, b in zip(x[valid], y[valid, j]))
+        svg = (f"<svg xmlns='http://www.w3.org/2000/svg' width='{width}' height='{height}'>"
+               f"<polyline fill='none' stroke='{SPARK_COLOR}' stroke-width='1' points='{coords}'/></svg>")
+        encoded = base64.b64encode(svg.encode()).decode()
+        svgs[column] = f'<img src="data:image/svg+xml;base64,{encoded}" style="vertical-align:middle;margin-left:4px;">'
+    return svgs
+
+
+
+
+
+##############################################
+######## Sparkline Cache
+##############################################
+
+# Pre-rendered sparkline HTML per (metric, sector, as-of), read from the history cube.
+# An entry is re-rendered only when the cube's slices inside its window change.
+class SparklineCache:
+
+    def __init__(self, days=365, max_entries=4096):
+        self.days = days
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+
+    def render(self, cube, metrics, as_of):
+        # {metric: {sector: html}} for every metric, one year of history ending on as_of
+        start = (pd.Timestamp(as_of) - pd.Timedelta(days = self.days)).strftime('%Y-%m-%d')
+        index = cube.index()
+        # The cube file is part of the version: a rewrite renumbers the slices, so a slot can come back with new values
+        version = (index['file'], tuple(sorted((date, row) for date, row in index['dates'].items() if start <= date <= as_of)))
+
+        results = {}
+        with self.lock:
+            for metric in metrics:
+                key = (metric, as_of)
+                if key in self.entries and self.entries[key][0] == version:
+                    self.entries.move_to_end(key)
+                else:
+                    history = cube.series(metric, start = start, end = as_of)
+                    self.entries[key] = (version, sparkline_svgs(history) if history is not None else {})
+                    while len(self.entries) > self.max_entries:
+                        self.entries.popitem(last = False)
+                results[metric] = self.entries[key][1]
+        return results
@@ -0,0 +1,28 @@
+###########################################
+########## Package Imports
+###########################################
+import os, sys
+import numpy as np, pandas as pd
+import pytest
+
+# The dashboard modules live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+
+
+
+##############################################
+######## Shared Fixtures
+##############################################
+
+@pytest.fixture
+def prices():
+    # Three years of business-day price paths for three instruments and a market index, with a few gaps
+    rng = np.random.default_rng(7)
+    dates = pd.bdate_range('2022-01-03', '2024-12-31')
+    returns = rng.normal(0.0003, 0.01, (len(dates), 4))
+    returns[:, :3] += 0.8 * returns[:, [3]]
+    frame = pd.DataFrame(100 * np.exp(np.cumsum(returns, axis = 0)), index = dates, columns = ['A', 'B', 'C', 'TOTMKWD'])
+    frame.iloc[[40, 41, 300], 1] = np.nan
+    return frame
@@ -0,0 +1,141 @@
+###########################################
+########## Package Imports
+###########################################
+import numpy as np, pandas as pd
+import pytest
+from ds_expr import Evaluator, is_local, leaves, lookback, parse
+from rolling import RollingRegressions
+
+
+
+
+
+##############################################
+######## Parser
+##############################################
+
+def test_parse_leaves():
+    assert parse('X/TOTMKWD') == ('op', '/', ('leaf', None, 'X'), ('leaf', 'TOTMKWD', 'X'))
+    assert parse('E062(X)') == ('leaf', None, 'E062(X)')
+    assert leaves(parse('(X(MV)/TOTMKWD(MV))*100.00')) == {(None, 'X(MV)'), ('TOTMKWD', 'X(MV)')}
+    assert leaves(parse('REGB#(LN#(TOTMKWD/LAG#(TOTMKWD,1M)),LN#(X/LAG#(X,1M)),60M)')) == {(None, 'X'), ('TOTMKWD', 'X')}
+
+
+def test_lookback():
+    assert lookback(parse('PCH#(X,20D)')) == 28
+    assert lookback(parse('MAV#(PCH#(X,1M),3M)')) == 31 + 3 * 31
+    assert lookback(parse('AVG#(X(PE),-20Y,)')) == 20 * 366
+    assert lookback(parse('X(PE)')) == 0
+
+
+@pytest.mark.parametrize('expression, local', [
+    ('PCH#(X,1Y)', True),
+    ('100*(REB#(X)/MAV#(REB#(X),200D)-1.00)', True),
+    ('(X(DIPE)-AVG#(X(DIPE),-20Y,))/SDN#(X(DIPE),-20Y,)', True),
+    ('REBE#(X/TOTMKWD,MTE)', True),
+    ('PCHV#(X,MTD)', False),
+    ('RSI#(X,14D)', False),
+    ('PCH#(X)', False),
+    ('X +', False),
+])
+def test_is_local(expression, local):
+    assert is_local(expression) == local
+
+
+
+
+
+##############################################
+######## Evaluator Against Pandas
+##############################################
+
+AS_OF = [pd.Timestamp('2023-03-15'), pd.Timestamp('2024-02-29'), pd.Timestamp('2024-12-31')]
+
+
+@pytest.fixture
+def evaluator(prices):
+    return Evaluator({('A,B,C', 'X'): prices[['A', 'B', 'C']], ('TOTMKWD', 'X'): prices[['TOTMKWD']]})
+
+
+def evaluated(evaluator, expression, as_of):
+    return evaluator.evaluate(expression, 'A,B,C', as_of)
+
+
+def window_pairs(prices, as_of, rows):
+    # Each instrument paired with the market over the trailing rows, pairwise-complete like DS
+    window = prices[prices.index <= as_of].tail(rows)
+    return {column: window[[column, 'TOTMKWD']].dropna() for column in ['A', 'B', 'C']}
+
+
+@pytest.mark.parametrize('as_of', AS_OF)
+def test_pch(evaluator, prices, as_of):
+    x = prices[['A', 'B', 'C']]
+    expected = 100 * (x / x.shift(20) - 1).loc[as_of]
+    pd.testing.assert_series_equal(evaluated(evaluator, 'PCH#(X,20D)', as_of), expected, check_names = False)
+
+    month_ago = x.index[x.index <= as_of - pd.DateOffset(months = 1)][-1]
+    expected = 100 * (x.loc[as_of] / x.loc[month_ago] - 1)
+    pd.testing.assert_series_equal(evaluated(evaluator, 'PCH#(X,1M)', as_of), expected, check_names = False)
+
+
+@pytest.mark.parametrize('as_of', AS_OF)
+def test_mav(evaluator, prices, as_of):
+    expected = prices[['A', 'B', 'C']].rolling(200, min_periods = 1).mean().loc[as_of]
+    pd.testing.assert_series_equal(evaluated(evaluator, 'MAV#(X,200D)', as_of), expected, check_names = False)
+
+
+@pytest.mark.parametrize('as_of', AS_OF)
+def test_relative_to_market(evaluator, prices, as_of):
+    relative = prices[['A', 'B', 'C']].div(prices['TOTMKWD'], axis = 0)
+    month_ago = relative.index[relative.index <= as_of - pd.DateOffset(months = 1)][-1]
+    expected = 100 * (relative.loc[as_of] / relative.loc[month_ago] - 1)
+    pd.testing.assert_series_equal(evaluated(evaluator, 'PCH#(X/TOTMKWD,1M)', as_of), expected, check_names = False)
+
+
+@pytest.mark.parametrize('as_of', AS_OF)
+def test_regb_corr(evaluator, prices, as_of):
+    pairs = window_pairs(prices, as_of, 60)
+    beta = pd.Series({column: pair.cov().iloc[0, 1] / pair['TOTMKWD'].var() for column, pair in pairs.items()})
+    corr = pd.Series({column: pair.corr().iloc[0, 1] for column, pair in pairs.items()})
+    np.testing.assert_allclose(evaluated(evaluator, 'REGB#(TOTMKWD,X,60D)', as_of), beta, rtol = 1e-9)
+    np.testing.assert_allclose(evaluated(evaluator, 'CORR#(TOTMKWD,X,60D)', as_of), corr, rtol = 1e-9)
+
+
+@pytest.mark.parametrize('as_of', AS_OF)
+def test_avg_sdn(evaluator, prices, as_of):
+    x = prices[['A', 'B', 'C']]
+    window = x[(x.index > as_of - pd.DateOffset(years = 1)) & (x.index <= as_of)]
+    np.testing.assert_allclose(evaluated(evaluator, 'AVG#(X,-1Y,)', as_of), window.mean(), rtol = 1e-9)
+    np.testing.assert_allclose(evaluated(evaluator, 'SDN#(X,-1Y,)', as_of), window.std(), rtol = 1e-9)
+
+    expected = (x.loc[as_of] - window.mean()) / window.std()
+    np.testing.assert_allclose(evaluated(evaluator, '(X-AVG#(X,-1Y,))/SDN#(X,-1Y,)', as_of), expected, rtol = 1e-9)
+
+
+@pytest.mark.parametrize('expression, freq', [
+    ('REGB#(LN#(TOTMKWD/LAG#(TOTMKWD,1M)),LN#(X/LAG#(X,1M)),24M)', 'M'),
+    ('CORR#(PCH#(X,4W),PCH#(TOTMKWD,4W),200D)', 'D'),
+])
+def test_regression_engine_matches_evaluator(prices, expression, freq):
+    # The engine's history ends on the evaluator's value, and a day later only that day is added
+    engines = RollingRegressions()
+    for as_of in [pd.Timestamp('2024-12-30'), pd.Timestamp('2024-12-31')]:
+        evaluator = Evaluator({('A,B,C', 'X'): prices[['A', 'B', 'C']], ('TOTMKWD', 'X'): prices[['TOTMKWD']]})
+        kind, window, x, y = evaluator.regression(expression, 'A,B,C', as_of, freq)
+        history = engines.extend(expression, window, x, y)[0 if kind == 'beta' else 1]
+        np.testing.assert_allclose(history.iloc[-1], evaluator.evaluate(expression, 'A,B,C', as_of, freq), rtol = 1e-9)
+    assert evaluator.regression('PCH#(X,1M)', 'A,B,C', as_of) is None
+
+
+def test_rebase_and_conditions(evaluator, prices):
+    as_of = AS_OF[-1]
+    x = prices[['A', 'B', 'C']]
+    np.testing.assert_allclose(evaluated(evaluator, 'REB#(X)', as_of), 100 * x.loc[as_of] / x.iloc[0], rtol = 1e-12)
+    np.testing.assert_allclose(evaluated(evaluator, 'REBE#(X,MTE)', as_of), 100.0)
+
+    above = (x.loc[as_of] > x.rolling(20, min_periods = 1).mean().loc[as_of]).astype(float)
+    np.testing.assert_array_equal(evaluated(evaluator, 'IF#(X-MAV#(X,20D),GT,ZERO)', as_of), above)
+
+
+def test_missing_series_is_nan(evaluator):
+    assert evaluated(evaluator, 'X(PE)', AS_OF[-1]).isna().all()
@@ -0,0 +1,55 @@
+###########################################
+########## Package Imports
+###########################################
+import os
+import numpy as np, pandas as pd
+from history_cube import HistoryCube
+
+
+
+
+
+##############################################
+######## History Cube
+##############################################
+
+def slice_of(value, metrics=('m', 'n')):
+    return pd.DataFrame(value, index = ['a', 'b', 'c'], columns = list(metrics))
+
+
+def test_unindexed_write_is_overwritten(tmp_path):
+    cube = HistoryCube(str(tmp_path))
+    cube.append('2026-10-01', slice_of(1.0))
+
+    # A crash after the data write but before the index update leaves an unindexed slice at the end
+    with open(os.path.join(str(tmp_path), cube.index()['file']), 'ab') as f:
+        f.write(np.full(6, 9.0, dtype = np.float32).tobytes())
+
+    cube.append('2026-10-02', slice_of(2.0))
+    cube.append('2026-10-03', slice_of(3.0))
+    for day in (1, 2, 3):
+        assert (cube.frame(f'2026-10-0{day}').to_numpy() == day).all()
+
+
+def test_new_metric_widens_cube(tmp_path):
+    cube = HistoryCube(str(tmp_path))
+    cube.append('2026-10-01', slice_of(1.0))
+    cube.append('2026-10-02', slice_of(2.0, ('m', 'n', 'o')))
+    assert cube.frame('2026-10-01')['o'].isna().all() and (cube.frame('2026-10-01')[['m', 'n']] == 1.0).all().all()
+    assert list(cube.series('m').to_numpy()[:, 0]) == [1.0, 2.0]
+
+
+def test_refreshed_dates_are_compacted(tmp_path):
+    # Refreshing the same dates over and over keeps at most one superseded slice per live one
+    cube = HistoryCube(str(tmp_path))
+    for refresh in range(10):
+        for day in (1, 2):
+            cube.append(f'2026-10-0{day}', slice_of(10.0 * day + refresh))
+    index = cube.index()
+    assert index['slices'] <= 2 * len(index['dates'])
+    assert os.path.getsize(os.path.join(str(tmp_path), index['file'])) == index['slices'] * 6 * 4
+    assert list(cube.series('m').to_numpy()[:, 0]) == [19.0, 29.0]
+
+    # A reshape for a new metric leaves exactly one slice per date
+    cube.append('2026-10-03', slice_of(3.0, ('m', 'n', 'o')))
+    assert cube.index()['slices'] == 3 and list(cube.series('m').to_numpy()[:, 0]) == [19.0, 29.0, 3.0]
@@ -0,0 +1,147 @@
+###########################################
+########## Package Imports
+###########################################
+import numpy as np, pandas as pd
+import pytest
+from rolling import RollingCorrelationMatrix, RollingRegression
+
+
+
+
+
+##############################################
+######## Rolling Correlation Matrix
+##############################################
+
+@pytest.fixture
+def returns(prices):
+    return np.log(prices / prices.shift(1)).iloc[1:]
+
+
+def test_fit_matches_pandas(returns):
+    matrix = RollingCorrelationMatrix(200).fit(returns)
+    pd.testing.assert_frame_equal(matrix, returns.tail(200).corr(), rtol = 1e-9)
+
+
+def test_update_matches_refit(returns):
+    engine = RollingCorrelationMatrix(200)
+    engine.fit(returns.iloc[:-50])
+    for _, row in returns.iloc[-50:].iterrows():
+        matrix = engine.update(row)
+    pd.testing.assert_frame_equal(matrix, returns.tail(200).corr(), rtol = 1e-9)
+
+
+def test_pairwise_missing_values(returns):
+    # A column missing inside the window only drops the rows it is missing from its own pairs
+    window = returns.iloc[-200:].copy()
+    window.iloc[10:30, 0] = np.nan
+    pd.testing.assert_frame_equal(RollingCorrelationMatrix(200).fit(window), window.corr(), rtol = 1e-9)
+
+
+def test_extend_adds_only_new_days(returns):
+    engine = RollingCorrelationMatrix(200)
+    engine.extend(returns.iloc[:-30])
+    fits, updates = [], []
+    engine.fit = lambda frame, fit = engine.fit: fits.append(frame.index[-1]) or fit(frame)
+    engine.update = lambda row, update = engine.update: updates.append(row.name) or update(row)
+
+    pd.testing.assert_frame_equal(engine.extend(returns), returns.tail(200).corr(), rtol = 1e-9)
+    assert fits == [] and updates == list(returns.index[-30:])
+
+    # An earlier as-of date doesn't continue the window, so it is refitted
+    pd.testing.assert_frame_equal(engine.extend(returns.iloc[:-100]), returns.iloc[:-100].tail(200).corr(), rtol = 1e-9)
+    assert fits == [returns.index[-101]]
+
+
+def test_extend_reapplies_revised_days(returns):
+    # Today's provisional return and a revision a few days back are swapped in without a refit
+    engine = RollingCorrelationMatrix(200)
+    engine.extend(returns.iloc[:-1])
+    fits = []
+    engine.fit = lambda frame, fit = engine.fit: fits.append(frame.index[-1]) or fit(frame)
+
+    revised = returns.copy()
+    revised.iloc[-2] *= 1.5
+    revised.iloc[-6, 0] = np.nan
+    pd.testing.assert_frame_equal(engine.extend(revised), revised.tail(200).corr(), rtol = 1e-9)
+
+    revised.iloc[-1] *= -1
+    pd.testing.assert_frame_equal(engine.extend(revised), revised.tail(200).corr(), rtol = 1e-9)
+    assert fits == []
+
+
+def test_non_finite_returns_are_masked(returns):
+    # A zero price gives an infinite log return, which must not poison its row and column
+    window = returns.iloc[-200:].copy()
+    window.iloc[50, 1] = -np.inf
+    expected = window.replace(-np.inf, np.nan).corr()
+    pd.testing.assert_frame_equal(RollingCorrelationMatrix(200).fit(window), expected, rtol = 1e-9)
+
+    engine = RollingCorrelationMatrix(200)
+    engine.fit(window.iloc[:-1])
+    row = window.iloc[-1].copy()
+    row.iloc[2] = np.inf
+    expected = pd.concat([window.iloc[:-1], row.to_frame().T]).replace([np.inf, -np.inf], np.nan).tail(200).corr()
+    pd.testing.assert_frame_equal(engine.update(row), expected, rtol = 1e-9)
+
+
+
+
+
+##############################################
+######## Rolling Regression Engine
+##############################################
+
+def expected_beta_corr(returns, end, rows):
+    # Each instrument on the market over the `rows` days ending at end, pairwise-complete
+    window = returns[returns.index <= end].tail(rows)
+    pairs = {column: window[[column, 'TOTMKWD']].dropna() for column in ['A', 'B', 'C']}
+    beta = pd.Series({column: pair.cov().iloc[0, 1] / pair['TOTMKWD'].var() for column, pair in pairs.items()})
+    corr = pd.Series({column: pair.corr().iloc[0, 1] for column, pair in pairs.items()})
+    return beta, corr
+
+
+def market_and_sectors(returns):
+    x = pd.DataFrame(np.repeat(returns[['TOTMKWD']].to_numpy(), 3, axis = 1), index = returns.index, columns = ['A', 'B', 'C'])
+    return x, returns[['A', 'B', 'C']]
+
+
+def test_regression_history_matches_pandas(returns):
+    x, y = market_and_sectors(returns)
+    beta, corr = RollingRegression(60).fit(x, y)
+    for end in [returns.index[100], returns.index[-1]]:
+        expected_beta, expected_corr = expected_beta_corr(returns, end, 60)
+        np.testing.assert_allclose(beta.loc[end], expected_beta, rtol = 1e-9)
+        np.testing.assert_allclose(corr.loc[end], expected_corr, rtol = 1e-9)
+
+
+def test_regression_extend_updates_new_days(returns):
+    x, y = market_and_sectors(returns)
+    engine = RollingRegression(60)
+    engine.extend(x.iloc[:-20], y.iloc[:-20])
+    fits = []
+    engine.fit = lambda x, y, fit = engine.fit: fits.append(x.index[-1]) or fit(x, y)
+
+    beta, corr = engine.extend(x, y)
+    expected_beta, expected_corr = RollingRegression(60).fit(x, y)
+    assert fits == []
+    pd.testing.assert_frame_equal(beta, expected_beta, rtol = 1e-9, check_freq = False)
+    pd.testing.assert_frame_equal(corr, expected_corr, rtol = 1e-9, check_freq = False)
+
+    # A revised day still inside the window refits
+    revised = y.copy()
+    revised.iloc[-5] *= 1.5
+    beta, _ = engine.extend(x, revised)
+    assert fits == [x.index[-1]]
+    np.testing.assert_allclose(beta.iloc[-1], expected_beta_corr(returns.assign(**revised), returns.index[-1], 60)[0], rtol = 1e-9)
+
+
+def test_regression_offset_window(returns):
+    # A calendar window drops the days older than the offset, like REGB#(...,3M)
+    x, y = market_and_sectors(returns)
+    engine = RollingRegression(pd.DateOffset(months = 3))
+    engine.fit(x.iloc[:-10], y.iloc[:-10])
+    for date in x.index[-10:]:
+        engine.update(date, x.loc[date], y.loc[date])
+    expected, _ = RollingRegression(pd.DateOffset(months = 3)).fit(x, y)
+    np.testing.assert_allclose(engine.beta.to_numpy(), expected.to_numpy(), rtol = 1e-9)
@@ -0,0 +1,89 @@
+###########################################
+########## Package Imports
+###########################################
+import os
+import numpy as np, pandas as pd
+import pytest
+from series_store import SeriesStore
+from zscore import ZScoreEngine
+
+
+
+
+
+##############################################
+######## Helpers
+##############################################
+
+class Source:
+
+    # fetch_series stand-in serving a fixed (dates x instruments) frame for every field from start onwards
+    def __init__(self, frame):
+        self.frame = frame
+        self.calls = []
+
+
+    def __call__(self, tickers, fields, start, end):
+        self.calls.append((tuple(fields), start))
+        rows = self.frame[self.frame.index >= start]
+        return {field: rows[tickers.split(',')] for field in fields}
+
+
+def expected_zscores(frame, today, years):
+    # (latest - mean) / std over the observations after today - years
+    window = frame[(frame.index > today - pd.DateOffset(years = years)) & (frame.index <= today)]
+    return (window.ffill().iloc[-1] - window.mean()) / window.std()
+
+
+@pytest.fixture
+def today(monkeypatch):
+    # Move the engine's clock by calling the returned function with a date
+    def set_today(date):
+        monkeypatch.setattr(pd.Timestamp, 'today', classmethod(lambda cls: pd.Timestamp(date)))
+        return pd.Timestamp(date)
+    return set_today
+
+
+
+
+
+##############################################
+######## Z-Score Engine
+##############################################
+
+def test_cold_matches_pandas(tmp_path, prices, today):
+    now = today('2024-12-31')
+    engine = ZScoreEngine(SeriesStore(str(tmp_path), Source(prices)), years = 1)
+    scores = engine.update('A,B,C', ['X(PE)'])['X(PE)']
+    np.testing.assert_allclose(scores, expected_zscores(prices[['A', 'B', 'C']], now, 1), rtol = 1e-9)
+
+
+def test_append_revise_expire(tmp_path, prices, today):
+    frame = prices[['A', 'B', 'C']]
+    today('2024-12-20')
+    source = Source(frame[frame.index <= '2024-12-20'])
+    engine = ZScoreEngine(SeriesStore(str(tmp_path), source, max_age = 0), years = 1)
+    engine.update('A,B,C', ['X(PE)'])
+
+    # Eleven days later, with the last stored day revised: only the tail is fetched, the revision replaces
+    # the stored value in the running sums and the days that left the window are taken out
+    now = today('2024-12-31')
+    revised = frame.copy()
+    revised.loc['2024-12-20'] *= 1.05
+    source.frame = revised
+    scores = engine.update('A,B,C', ['X(PE)'])['X(PE)']
+
+    assert source.calls[-1] == (('X(PE)',), '2024-12-13')
+    np.testing.assert_allclose(scores, expected_zscores(revised, now, 1), rtol = 1e-9)
+
+    # A new process picks the stored history up from disk
+    reloaded = ZScoreEngine(SeriesStore(str(tmp_path), source), years = 1).update('A,B,C', ['X(PE)'])['X(PE)']
+    np.testing.assert_allclose(reloaded, scores, rtol = 1e-9)
+
+
+def test_empty_fetch_scores_nan(tmp_path, today):
+    today('2024-12-31')
+    engine = ZScoreEngine(SeriesStore(str(tmp_path), lambda tickers, fields, start, end: {}), years = 1)
+    scores = engine.update('A,B,C', ['X(PE)'])['X(PE)']
+    assert list(scores.index) == ['A', 'B', 'C'] and scores.isna().all()
+    assert os.listdir(tmp_path) == []
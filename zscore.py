@@ -0,0 +1,103 @@
+###########################################
+########## Package Imports
+###########################################
+import threading
+import numpy as np, pandas as pd
+
+
+
+
+
+##############################################
+######## Running Window Statistics
+##############################################
+
+# Per-instrument sums over the window, taken around a fixed shift for numerical stability
+STAT_COLUMNS = ['count', 'total', 'total_sq', 'shift']
+
+
+def empty_stats(instruments, shift):
+    return pd.DataFrame({'count': 0.0, 'total': 0.0, 'total_sq': 0.0, 'shift': shift},
+                        index = pd.Index(instruments, name = 'Instrument'))[STAT_COLUMNS]
+
+
+def add_rows(stats, rows, sign=1.0):
+    # Add (sign=1) or remove (sign=-1) observations from the running sums
+    if rows.empty:
+        return stats
+    values = rows.reindex(columns = stats.index).to_numpy(dtype = float) - stats['shift'].to_numpy()
+    valid = ~np.isnan(values)
+    values = np.where(valid, values, 0.0)
+
+    stats = stats.copy()
+    stats['count'] += sign * valid.sum(axis = 0)
+    stats['total'] += sign * values.sum(axis = 0)
+    stats['total_sq'] += sign * (values ** 2).sum(axis = 0)
+    return stats
+
+
+def zscores(stats, latest, ddof=1):
+    # (latest - mean) / standard deviation from the running sums
+    n = stats['count']
+    mean = stats['total'] / n
+    var = (stats['total_sq'] - n * mean ** 2) / (n - ddof)
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        return (latest.reindex(stats.index) - stats['shift'] - mean) / np.sqrt(var.clip(lower = 0))
+
+
+
+
+
+##############################################
+######## Incremental Z-Score Engine
+##############################################
+
+# Local replacement for (X-AVG#(X,-20Y,))/SDN#(X,-20Y,): the raw 20-year daily series come from the
+# base series store (fetched once, then only their new days), and the running window sums of each
+# series are updated with only the rows that were added, revised or expired since the last update.
+class ZScoreEngine:
+
+    def __init__(self, fetch_series, years=20, ddof=1):
+        # fetch_series(tickers, fields, start, end) -> {field: (dates x instruments) frame}, normally a SeriesStore
+        self.fetch_series = fetch_series
+        self.years = years
+        self.ddof = ddof
+        self.state = {}
+        self.lock = threading.Lock()
+
+
+    def update(self, tickers, fields):
+        # Bring every (tickers, field) series up to date and return {field: z-score per instrument}
+        today = pd.Timestamp.today().normalize()
+        window_start = today - pd.DateOffset(years = self.years)
+
+        with self.lock:
+            fetched = self.fetch_series(tickers, list(fields), window_start.strftime('%Y-%m-%d'), '-0d')
+
+            results = {}
+            for field in fields:
+                history = fetched.get(field)
+                if history is None or history.empty:
+                    # Nothing came back (the DSWS client returns None on any error): no scores, and the
+                    # running sums are left as they were for the next update
+                    results[field] = pd.Series(np.nan, index = pd.Index(tickers.split(','), name = 'Instrument'))
+                    continue
+                history = history.sort_index()
+                history = history[history.index > window_start]
+
+                previous = self.state.get((tickers, field))
+                if previous is None or not previous[0].columns.equals(history.columns):
+                    shift = history.bfill().iloc[0].fillna(0.0).to_numpy()
+                    stats = add_rows(empty_stats(history.columns, shift), history)
+                else:
+                    # Take out the rows that expired or were revised, add the new and revised ones
+                    old, stats = previous
+                    common = old.index.intersection(history.index)
+                    before, after = old.loc[common], history.loc[common]
+                    revised = common[((before != after) & ~(before.isna() & after.isna())).any(axis = 1).to_numpy()]
+                    stats = add_rows(stats, old.loc[old.index.difference(history.index).union(revised)], -1.0)
+                    stats = add_rows(stats, history.loc[history.index.difference(old.index).union(revised)])
+                self.state[(tickers, field)] = (history, stats)
+
+                results[field] = zscores(stats, history.ffill().iloc[-1], self.ddof)
+            return results